@@ -0,0 +1,133 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from st3215 import ST3215
+from st3215.values import *
+
+
+DEFAULT_URL = "sim://bench?ids=1-8"
+SERVO_COUNTS = (1, 2, 4, 8, 16, 32, 64, 128, 250)
+
+# servos per frame: HEADER0 HEADER1 ID LEN INST START_ADDR DATA_LEN ... CHKSUM
+SYNC_WRITE_MAX = (TXPACKET_MAX_LEN - 8) // 3  # ID + 2 bytes of goal position per servo
+SYNC_READ_MAX = TXPACKET_MAX_LEN - 8  # ID per servo
+
+
+def percentiles(samples):
+    """Summary of a list of durations (same unit as the samples)."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+
+    def at(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "min": ordered[0],
+        "p50": at(0.50),
+        "p90": at(0.90),
+        "p99": at(0.99),
+        "max": ordered[-1],
+    }
+
+
+def chunks(ids, size):
+    return [ids[i: i + size] for i in range(0, len(ids), size)]
+
+
+def latency(url = DEFAULT_URL, sts_id = 1, number = 1000):
+    """txRxPacket round trip (instruction packet + status packet), in ms."""
+    servo = ST3215(url)
+    transactions = {
+        "ping": lambda: servo.ping(sts_id)[1],
+        "read_position": lambda: servo.read2ByteTxRx(sts_id, STS_PRESENT_POSITION_L)[1],
+    }
+
+    results = {}
+    for name, transaction in transactions.items():
+        samples = []
+        failures = 0
+        for _ in range(number):
+            start = time.perf_counter_ns()
+            result = transaction()
+            elapsed = (time.perf_counter_ns() - start) / 1e6
+            if result == COMM_SUCCESS:
+                samples.append(elapsed)
+            else:
+                failures += 1
+        results[name] = {"latency_ms": percentiles(samples), "failures": failures}
+
+    servo.portHandler.closePort()
+    return results
+
+
+def scan(url = DEFAULT_URL):
+    """ListServos over the whole ID range."""
+    servo = ST3215(url)
+    start = time.perf_counter()
+    found = servo.ListServos(rescan=True)
+    elapsed = time.perf_counter() - start
+    servo.portHandler.closePort()
+    return {"seconds": elapsed, "found": found}
+
+
+def sync_scaling(counts = SERVO_COUNTS, duration = 0.5):
+    """
+    Sync write and sync read throughput against the number of servos, on a virtual bus at 1 Mbps.
+    Servos that do not fit in one frame are split over several frames.
+    """
+    results = {}
+    for count in counts:
+        servo = ST3215(f"sim://sync{count}?ids=1-{count}")
+        ids = list(range(1, count + 1))
+
+        write_frames = [{sts_id: 2048 for sts_id in chunk} for chunk in chunks(ids, SYNC_WRITE_MAX)]
+        iterations = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < duration:
+            for positions in write_frames:
+                servo.SyncWritePosition(positions)
+                servo.portHandler.clearPort()  # wait for the frame to leave the wire
+            iterations += 1
+        write_time = (time.perf_counter() - start) / iterations
+
+        read_frames = chunks(ids, SYNC_READ_MAX)
+        iterations = 0
+        answered = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < duration:
+            for frame in read_frames:
+                telemetry = servo.ReadAll(frame, ("position",))
+                answered += sum(1 for value in telemetry.values() if value is not None)
+            iterations += 1
+        read_time = (time.perf_counter() - start) / iterations
+
+        results[count] = {
+            "sync_write_frames": len(write_frames),
+            "sync_write_per_s": 1.0 / write_time,
+            "servo_writes_per_s": count / write_time,
+            "sync_read_frames": len(read_frames),
+            "sync_read_per_s": 1.0 / read_time,
+            "servo_reads_per_s": count / read_time,
+            "sync_read_success": answered / (iterations * count),
+        }
+        servo.portHandler.closePort()
+
+    return results
+
+
+if __name__ == "__main__":
+    url = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_URL
+    for name, result in latency(url).items():
+        summary = result["latency_ms"]
+        print(f"{name:14s} p50 {summary['p50']:.3f} ms  p99 {summary['p99']:.3f} ms  failures {result['failures']}")
+    result = scan(url)
+    print(f"ListServos     {result['seconds']:.3f} s  {result['found']}")
+    for count, result in sync_scaling().items():
+        print(f"{count:3d} servos  sync write {result['servo_writes_per_s']:10,.0f} servo/s"
+              f"  sync read {result['servo_reads_per_s']:10,.0f} servo/s ({result['sync_read_success']:.0%})")
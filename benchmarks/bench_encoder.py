@@ -0,0 +1,98 @@
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from st3215.packet_encoder import PacketEncoder
+from st3215.values import *
+
+
+# Packet construction as done by protocol_packet_handler before PacketEncoder:
+# a fresh list per packet, a Python checksum loop, then the list -> bytes
+# conversion made by pyserial in write().
+def legacy_packet(txpacket):
+    checksum = 0
+    total_packet_length = txpacket[PKT_LENGTH] + 4
+
+    txpacket[PKT_HEADER_0] = 0xFF
+    txpacket[PKT_HEADER_1] = 0xFF
+
+    for idx in range(2, total_packet_length - 1):
+        checksum += txpacket[idx]
+
+    txpacket[total_packet_length - 1] = ~checksum & 0xFF
+    return bytes(bytearray(txpacket))
+
+
+def legacy_read(sts_id, address, length):
+    txpacket = [0] * 8
+    txpacket[PKT_ID] = sts_id
+    txpacket[PKT_LENGTH] = 4
+    txpacket[PKT_INSTRUCTION] = INST_READ
+    txpacket[PKT_PARAMETER0 + 0] = address
+    txpacket[PKT_PARAMETER0 + 1] = length
+    return legacy_packet(txpacket)
+
+
+def legacy_write(sts_id, address, length, data):
+    txpacket = [0] * (length + 7)
+    txpacket[PKT_ID] = sts_id
+    txpacket[PKT_LENGTH] = length + 3
+    txpacket[PKT_INSTRUCTION] = INST_WRITE
+    txpacket[PKT_PARAMETER0] = address
+    txpacket[PKT_PARAMETER0 + 1: PKT_PARAMETER0 + 1 + length] = data[0: length]
+    return legacy_packet(txpacket)
+
+
+def legacy_sync_write(start_address, data_length, param, param_length):
+    txpacket = [0] * (param_length + 8)
+    txpacket[PKT_ID] = BROADCAST_ID
+    txpacket[PKT_LENGTH] = param_length + 4
+    txpacket[PKT_INSTRUCTION] = INST_SYNC_WRITE
+    txpacket[PKT_PARAMETER0 + 0] = start_address
+    txpacket[PKT_PARAMETER0 + 1] = data_length
+    txpacket[PKT_PARAMETER0 + 2: PKT_PARAMETER0 + 2 + param_length] = param[0: param_length]
+    return legacy_packet(txpacket)
+
+
+def cases():
+    encoder = PacketEncoder()
+    position = [0x00, 0x08]
+    sync_param = []
+    for sts_id in range(1, 9):
+        sync_param.extend([sts_id, 0x00, 0x08])
+
+    return {
+        "read": (lambda: legacy_read(1, STS_PRESENT_POSITION_L, 2),
+                 lambda: encoder.read(1, STS_PRESENT_POSITION_L, 2).tobytes()),
+        "write": (lambda: legacy_write(1, STS_GOAL_POSITION_L, 2, position),
+                  lambda: encoder.write(1, STS_GOAL_POSITION_L, 2, position).tobytes()),
+        "sync_write_8": (lambda: legacy_sync_write(STS_GOAL_POSITION_L, 2, sync_param, len(sync_param)),
+                         lambda: encoder.sync(INST_SYNC_WRITE, STS_GOAL_POSITION_L, 2,
+                                              sync_param, len(sync_param)).tobytes()),
+        "ping": (lambda: legacy_packet([0, 0, 1, 2, INST_PING, 0]),
+                 lambda: encoder.ping(1).tobytes()),
+    }
+
+
+def packets_per_second(func, number):
+    return number / min(timeit.repeat(func, number=number, repeat=5))
+
+
+def run(number = 100000):
+    results = {}
+    for name, (before, after) in cases().items():
+        if before() != after():
+            raise AssertionError(f"{name}: encoders disagree")
+        results[name] = {
+            "before": packets_per_second(before, number),
+            "after": packets_per_second(after, number),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    for name, result in run().items():
+        print(f"{name:14s} before: {result['before']:12,.0f} pkt/s   after: {result['after']:12,.0f} pkt/s"
+              f"   x{result['after'] / result['before']:.2f}")
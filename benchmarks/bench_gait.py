@@ -0,0 +1,70 @@
+import contextlib
+import io
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_bus import DEFAULT_URL, percentiles
+from gait import GAIT_CONFIGS, GaitMode, gait_angles
+import main
+
+
+def run(url = DEFAULT_URL, steps = 40, mode = "CREEP_FORWARD"):
+    """
+    Tick rate and jitter of main.execute_gait: time between two consecutive frames pushed.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        main.connect(url)
+
+    ticks = []
+    push_frame = main.push_frame
+
+    def timed(frame, sync = True):
+        ticks.append(time.perf_counter())
+        push_frame(frame, sync)
+
+    main.push_frame = timed
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            main.execute_gait(main.GaitMode[mode], steps = steps)
+    finally:
+        main.push_frame = push_frame
+        main.disconnect()
+
+    intervals = [(b - a) * 1000.0 for a, b in zip(ticks, ticks[1:])]
+    mean = sum(intervals) / len(intervals)
+    return {
+        "ticks": len(ticks),
+        "rate_hz": (len(ticks) - 1) / (ticks[-1] - ticks[0]),
+        "interval_ms": percentiles(intervals),
+        "jitter_ms": (sum((interval - mean) ** 2 for interval in intervals) / len(intervals)) ** 0.5,
+    }
+
+
+def rates(url = DEFAULT_URL, rates_hz = (50, 100), steps = 200, mode = "CREEP_FORWARD"):
+    """main.execute_gait at several loop rates: achieved rate, lateness of the ticks, overruns (ControlLoop.stats)."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        main.connect(url)
+        try:
+            return {rate: main.execute_gait(main.GaitMode[mode], steps = steps, dt = 1.0 / rate) for rate in rates_hz}
+        finally:
+            main.disconnect()
+
+
+def engine(samples = 1000, mode = "CREEP_FORWARD"):
+    """Frames (angles of the 4 legs) per second: one gait_angles call per tick, and one for a whole cycle."""
+    params = GAIT_CONFIGS[GaitMode[mode]]
+    phases = [i / samples for i in range(samples)]
+
+    per_tick = min(timeit.repeat(lambda: [gait_angles(params, [phase]) for phase in phases], number=1, repeat=5))
+    per_cycle = min(timeit.repeat(lambda: gait_angles(params, phases), number=1, repeat=5))
+    return {"per_tick_fps": samples / per_tick, "per_cycle_fps": samples / per_cycle}
+
+
+if __name__ == "__main__":
+    result = run(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_URL)
+    print(f"{result['rate_hz']:.2f} Hz  interval p50 {result['interval_ms']['p50']:.2f} ms"
+          f"  p99 {result['interval_ms']['p99']:.2f} ms  jitter {result['jitter_ms']:.2f} ms")
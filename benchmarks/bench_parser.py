@@ -0,0 +1,70 @@
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from st3215.capture import CaptureReader
+from st3215.packet_parser import PacketParser
+from st3215.values import *
+
+
+def status_packet(sts_id, params):
+    packet = bytearray([0xFF, 0xFF, sts_id, len(params) + 2, 0])
+    packet += bytes(params)
+    packet.append(~sum(packet[PKT_ID:]) & 0xFF)
+    return bytes(packet)
+
+
+def status_stream(number):
+    # READ replies of the present position, IDs 1..8
+    return b''.join(status_packet(1 + i % 8, [i & 0xFF, 0x08]) for i in range(number))
+
+
+def captured_stream(path):
+    # bytes received during a capture (PortHandler.startCapture)
+    reader = CaptureReader(path)
+    try:
+        return b''.join(payload for _, _, payload in reader.records(CAPTURE_RX))
+    finally:
+        reader.close()
+
+
+def decode(stream, chunk):
+    parser = PacketParser()
+    view = memoryview(stream)
+    decoded = 0
+    position = 0
+    while position < len(stream):
+        position += parser.feed(view[position: position + chunk])
+        while True:
+            packet, result = parser.nextPacket()
+            if packet is None:
+                break
+            decoded += 1
+    return decoded
+
+
+def run(number = 100000, capture = None):
+    """
+    :param number: number of synthetic status packets
+    :param capture: decode the bytes received in a capture file instead (facultative)
+    """
+    packet_length = len(status_packet(1, [0, 0]))
+    if capture is None:
+        stream = status_stream(number)
+    else:
+        stream = captured_stream(capture)
+        number = decode(stream, len(stream))
+
+    results = {}
+    for name, chunk in (("packet", packet_length), ("chunk_64", 64), ("chunk_512", 512)):
+        if decode(stream, chunk) != number:
+            raise AssertionError(f"{name}: lost packets")
+        results[name] = number / min(timeit.repeat(lambda: decode(stream, chunk), number=1, repeat=5))
+    return results
+
+
+if __name__ == "__main__":
+    for name, pps in run(capture=sys.argv[1] if len(sys.argv) > 1 else None).items():
+        print(f"{name:10s} {pps:12,.0f} pkt/s")
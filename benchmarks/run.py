@@ -0,0 +1,81 @@
+"""
+Run the whole benchmark suite and save the results as JSON.
+
+    python benchmarks/run.py                       # virtual bus (sim://)
+    python benchmarks/run.py --port /dev/ttyUSB0   # latency, scan and gait on a real bus
+    python benchmarks/run.py --quick -o out.json
+    python benchmarks/run.py --port replay://session.cap --capture session.cap
+
+The sync read/write scaling always runs on a virtual bus, as it needs up to 250 servos.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+
+import bench_bus
+import bench_encoder
+import bench_gait
+import bench_parser
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="st3215 bus and gait benchmarks")
+    parser.add_argument("--port", default=bench_bus.DEFAULT_URL, help="serial port or pyserial URL (default: %(default)s)")
+    parser.add_argument("-o", "--output", help="JSON file (default: benchmarks/results/<date>.json)")
+    parser.add_argument("--capture", help="decode the status packets of a capture file instead of synthetic ones")
+    parser.add_argument("--quick", action="store_true", help="fewer iterations")
+    args = parser.parse_args()
+
+    number = 20000 if args.quick else 100000
+    counts = (1, 8, 64, 250) if args.quick else bench_bus.SERVO_COUNTS
+    now = datetime.datetime.now()
+
+    results = {
+        "meta": {
+            "date": now.isoformat(timespec="seconds"),
+            "revision": revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "port": args.port,
+            "capture": args.capture,
+        },
+    }
+
+    steps = (
+        ("encode", lambda: bench_encoder.run(number)),
+        ("decode", lambda: bench_parser.run(number, args.capture)),
+        ("latency", lambda: bench_bus.latency(args.port, number=number // 100)),
+        ("scan", lambda: bench_bus.scan(args.port)),
+        ("sync", lambda: bench_bus.sync_scaling(counts, 0.2 if args.quick else 0.5)),
+        ("gait", lambda: bench_gait.run(args.port, steps=20 if args.quick else 40)),
+        ("gait_rates", lambda: bench_gait.rates(args.port, steps=100 if args.quick else 500)),
+        ("gait_engine", lambda: bench_gait.engine(200 if args.quick else 1000)),
+    )
+    for name, step in steps:
+        print(f"{name}...", file=sys.stderr)
+        results[name] = step()
+
+    output = args.output or os.path.join(ROOT, "benchmarks", "results", now.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
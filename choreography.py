@@ -0,0 +1,138 @@
+"""
+Choreografie: sekwencje póz zapisane w plikach JSON (lub YAML, jeśli jest PyYAML),
+kompilowane do tablicy klatek całego robota, odtwarzanej jedną ramką SYNC_WRITE na takt.
+
+{
+  "start": "neutral",                       # poza początkowa (domyślnie neutral)
+  "poses": {"hello": {"1": 45, "2": 30}},   # pozy własne, oprócz przekazanych do kompilatora
+  "keyframes": [
+    {"pose": "hello", "duration": 0.5},                          # ruch do pozy w 0.5 s
+    {"angles": {"2": 90, "1": "90-h"}, "duration": 0.5, "easing": "linear"},
+    {"repeat": 2, "keyframes": [...]},                           # powtórzenie sekwencji
+    {"duration": 0.5},                                           # pauza
+    {"pose": "neutral", "duration": 1.0}
+  ]
+}
+
+Klatka kluczowa: poza ("pose") i/lub kąty wybranych serw ("angles", nadpisują pozę), czas dojścia
+"duration" [s] i wygładzanie "easing" (EASINGS, domyślnie in_out). Serwa bez nowego kąta stoją.
+Kąty to liczby albo wyrażenia ze zmiennymi przekazanymi do kompilatora (np. "90-h+30").
+"""
+
+import ast
+import json
+import operator
+import os
+
+import numpy as np
+
+from gait import servo_positions
+
+CHOREOGRAPHY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'choreographies')
+
+EASINGS = {
+    'linear': lambda u: u,
+    'in': lambda u: u * u,
+    'out': lambda u: u * (2 - u),
+    'in_out': lambda u: u * u * (3 - 2 * u),
+    'step': lambda u: np.ones_like(u),     # od razu cel, serwo dochodzi własną prędkością
+}
+
+OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+}
+
+def load_choreography(path):
+    # nazwa (plik w CHOREOGRAPHY_DIR) albo ścieżka do pliku .json/.yaml/.yml
+    if not os.path.splitext(path)[1]:
+        path = os.path.join(CHOREOGRAPHY_DIR, path + '.json')
+
+    with open(path, encoding='utf-8') as f:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml  # pip install pyyaml
+            except ImportError:
+                raise ValueError(f"{path}: YAML choreographies need PyYAML (pip install pyyaml)")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+def angle_value(value, variables):
+    # liczba albo wyrażenie (+ - * /, nawiasy, zmienne)
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    def evaluate(node):
+        if isinstance(node, ast.Expression):
+            return evaluate(node.body)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return float(node.value)
+        if isinstance(node, ast.Name) and node.id in variables:
+            return float(variables[node.id])
+        if isinstance(node, ast.BinOp) and type(node.op) in OPERATORS:
+            return OPERATORS[type(node.op)](evaluate(node.left), evaluate(node.right))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return -evaluate(node.operand)
+        raise ValueError(f"invalid angle: {value!r}")
+
+    try:
+        return evaluate(ast.parse(str(value), mode='eval'))
+    except SyntaxError:
+        raise ValueError(f"invalid angle: {value!r}")
+
+def flatten_keyframes(keyframes):
+    # rozwinięcie powtórzeń
+    for keyframe in keyframes:
+        if 'repeat' in keyframe:
+            for _ in range(int(keyframe['repeat'])):
+                yield from flatten_keyframes(keyframe['keyframes'])
+        else:
+            yield keyframe
+
+def compile_choreography(spec, dt, poses, angle_limits, trims, variables=None):
+    # choreografia -> (ids, tablica (klatki, serwa) pozycji), jedna klatka co dt
+    variables = variables or {}
+    poses = dict(poses, **spec.get('poses', {}))
+
+    def pose_angles(name):
+        if name not in poses:
+            raise ValueError(f"unknown pose: {name!r}")
+        return {int(id): angle_value(angle, variables) for id, angle in poses[name].items()}
+
+    start = pose_angles(spec.get('start', 'neutral'))
+    state = start
+    keyframes = list(flatten_keyframes(spec['keyframes']))
+    targets = []
+    for keyframe in keyframes:
+        target = dict(state)
+        if 'pose' in keyframe:
+            target.update(pose_angles(keyframe['pose']))
+        target.update({int(id): angle_value(angle, variables) for id, angle in keyframe.get('angles', {}).items()})
+        targets.append(target)
+        state = target
+
+    ids = sorted(set(start).union(*targets))
+    previous = np.array([start.get(id, np.nan) for id in ids])
+
+    segments = []
+    for keyframe, target in zip(keyframes, targets):
+        easing = keyframe.get('easing', 'in_out')
+        if easing not in EASINGS:
+            raise ValueError(f"unknown easing: {easing!r}")
+        target = np.array([target.get(id, np.nan) for id in ids])
+        # serwo bez kąta początkowego: od razu na cel
+        origin = np.where(np.isnan(previous), target, previous)
+
+        count = max(1, int(round(float(keyframe.get('duration', 0)) / dt)))
+        progress = EASINGS[easing](np.arange(1, count + 1) / count)[:, None]
+        segments.append(origin + progress * (target - origin))
+        previous = target
+
+    angles = np.concatenate(segments)
+    # serwa bez żadnego kąta do pierwszej klatki, w której się pojawiają: pierwszy znany kąt
+    for column in range(len(ids)):
+        known = np.flatnonzero(~np.isnan(angles[:, column]))
+        angles[:known[0], column] = angles[known[0], column]
+    return ids, servo_positions(angles, ids, angle_limits, trims)
@@ -0,0 +1,104 @@
+import collections
+import math
+import time
+from enum import Enum
+
+LOOP_SPIN = 0.0005          # s, końcówka oczekiwania w aktywnej pętli (dokładność budzenia)
+LOOP_HISTORY = 10000        # liczba ostatnich taktów w statystykach
+
+class OverrunPolicy(Enum):
+    SKIP = 1                # pominąć spóźnione takty, następny w kolejnym terminie
+    CATCH_UP = 2            # wykonać spóźnione takty od razu, bez czekania (max_catch_up z rzędu)
+
+class ControlLoop:
+    # pętla sterowania o stałej częstotliwości: takt k ma termin start + k * dt (zegar monotoniczny),
+    # więc czas pracy taktu nie przesuwa kolejnych terminów; faza ruchu liczona z rzeczywistego czasu t
+
+    def __init__(self, dt, policy=OverrunPolicy.SKIP, max_catch_up=3, spin=LOOP_SPIN):
+        self.dt = dt
+        self.policy = policy
+        self.max_catch_up = max_catch_up
+        self.spin = spin
+        self.reset()
+
+    def reset(self):
+        self.ticks = 0
+        self.overruns = 0               # takty zakończone po terminie następnego
+        self.skipped = 0                # takty pominięte (OverrunPolicy.SKIP)
+        self.lateness = collections.deque(maxlen=LOOP_HISTORY)   # s, start taktu - termin
+        self.work = collections.deque(maxlen=LOOP_HISTORY)       # s, czas wykonania taktu
+        self.first = None               # start pierwszego i ostatniego taktu
+        self.last = None
+
+    def wait(self, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining > self.spin:
+            time.sleep(remaining - self.spin)
+        while time.monotonic() < deadline:
+            pass
+
+    def run(self, tick, steps=None):
+        # tick(step, t): step - numer terminu od startu, t - rzeczywisty czas od startu [s]
+        # tick zwraca False, żeby zatrzymać pętlę; steps=None: do zatrzymania (lub Ctrl+C)
+        start = time.monotonic()
+        step = 0
+        late_in_row = 0
+        executed = 0
+
+        while steps is None or executed < steps:
+            deadline = start + step * self.dt
+            self.wait(deadline)
+
+            begin = time.monotonic()
+            if self.first is None:
+                self.first = begin
+            self.last = begin
+            self.lateness.append(begin - deadline)
+            result = tick(step, begin - start)
+            end = time.monotonic()
+            self.work.append(end - begin)
+            self.ticks += 1
+            executed += 1
+            if result is False:
+                break
+
+            step += 1
+            if end <= start + step * self.dt:
+                late_in_row = 0
+                continue
+
+            # przekroczenie: praca skończyła się po terminie następnego taktu
+            self.overruns += 1
+            late_in_row += 1
+            if self.policy == OverrunPolicy.CATCH_UP and late_in_row <= self.max_catch_up:
+                continue
+
+            next_step = math.ceil((end - start) / self.dt)
+            self.skipped += next_step - step
+            step = next_step
+            late_in_row = 0
+
+    def stats(self):
+        # statystyki taktów: częstotliwość, spóźnienia startu (jitter) i czas pracy w ms
+        def summary(samples):
+            if not samples:
+                return None
+            ordered = sorted(samples)
+            at = lambda fraction: ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000.0
+            return {
+                "mean": sum(ordered) / len(ordered) * 1000.0,
+                "p50": at(0.50),
+                "p99": at(0.99),
+                "max": ordered[-1] * 1000.0,
+            }
+
+        return {
+            "rate_hz": 1.0 / self.dt,
+            "ticks": self.ticks,
+            "achieved_hz": (self.ticks - 1) / (self.last - self.first) if self.ticks > 1 else 0.0,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "lateness_ms": summary(self.lateness),
+            "work_ms": summary(self.work),
+            "load": sum(self.work) / len(self.work) / self.dt if self.work else 0.0,
+        }
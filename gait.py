@@ -0,0 +1,303 @@
+import dataclasses
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from enum import Enum
+
+import numpy as np
+
+h = 20                      # height
+x_amp = 30                  # x amplitude
+z_amp = 15                  # z amplitude
+offset_front = 0            # front leg offset
+offset_back = 45            # back legs offset
+
+LEGS = ('lf', 'rf', 'lr', 'rr')
+AXES = ('x', 'z')           # kolejność osi w tablicach kątów
+
+# skompilowane tablice klatek (gait_table): w pamięci i na dysku
+GAIT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.gait_cache')
+GAIT_TABLE_VERSION = 1      # zmienić przy każdej zmianie sposobu kompilacji
+gait_tables = {}            # klucz: (ids, tablica)
+
+class GaitProfile(Enum):
+    CREEP = 1               # unoszenie przez 25% cyklu, liniowy powrót
+    TROT = 2                # unoszenie przez 50% cyklu, powrót po cosinusie
+
+class GaitMode(Enum):
+    CREEP_FORWARD = 1
+    CREEP_BACKWARD = 2
+    CREEP_LEFT = 3
+    CREEP_RIGHT = 4
+    CREEP_TROT_FORWARD = 5
+    CREEP_TROT_BACKWARD = 6
+    CREEP_TROT_RIGHT = 7
+    CREEP_TROT_LEFT = 8
+    CREEP_TROT_MOVE_RIGHT = 9
+    CREEP_TROT_MOVE_LEFT = 10
+    TROT_FORWARD = 11
+    TROT_BACKWARD = 12
+
+@dataclass
+class GaitParams:
+    x_amps: tuple
+    z_amps: tuple
+    x_offsets: tuple
+    z_offsets: tuple
+    phase_offsets: tuple
+    profile: GaitProfile = GaitProfile.CREEP
+
+GAIT_CONFIGS = {
+    GaitMode.CREEP_FORWARD: GaitParams(
+        x_amps=(-x_amp, x_amp, -x_amp, x_amp),      # LF, RF, LR, RR
+        z_amps=(z_amp, -z_amp, -z_amp, z_amp),
+        x_offsets=(90 - offset_front, 90 + offset_front, 90 + offset_back, 90 - offset_back),
+        z_offsets=(90-h, 90+h, 90+h, 90-h),
+        phase_offsets=(0.00, 0.50, 0.25, 0.75)
+    ),
+    GaitMode.CREEP_BACKWARD: GaitParams(
+        x_amps=(x_amp, -x_amp, x_amp, -x_amp),
+        z_amps=(z_amp, -z_amp, -z_amp, z_amp),
+        x_offsets=(90 - offset_back, 90 + offset_back, 90 + offset_front, 90 - offset_front),
+        z_offsets=(90-h, 90+h, 90+h, 90-h),
+        phase_offsets=(0.25, 0.75, 0.00, 0.50)
+    ),
+    GaitMode.CREEP_LEFT: GaitParams(
+        x_amps=(x_amp, x_amp, x_amp, x_amp),
+        z_amps=(z_amp, -z_amp, -z_amp, z_amp),
+        x_offsets=(45-x_amp/2, 135-x_amp/2, 135-x_amp/2, 45-x_amp/2),
+        z_offsets=(90-h, 90+h, 90+h, 90-h),
+        phase_offsets=(0.00, 0.50, 0.25, 0.75)
+    ),
+    GaitMode.CREEP_RIGHT: GaitParams(
+        x_amps=(-x_amp, -x_amp, -x_amp, -x_amp),
+        z_amps=(z_amp, -z_amp, -z_amp, z_amp),
+        x_offsets=(45+x_amp/2, 135+x_amp/2, 135+x_amp/2, 45+x_amp/2),
+        z_offsets=(90-h, 90+h, 90+h, 90-h),
+        phase_offsets=(0.00, 0.50, 0.25, 0.75)
+    ),
+    GaitMode.CREEP_TROT_FORWARD: GaitParams(
+        x_amps=(-x_amp, x_amp, -x_amp, x_amp),
+        z_amps=(z_amp, -z_amp, -z_amp, z_amp),
+        x_offsets=(45+x_amp/2, 135-x_amp/2, 135+x_amp/2, 45-x_amp/2),
+        z_offsets=(90-h, 90+h, 90+h, 90-h),
+        phase_offsets=(0.50, 0.00, 0.00, 0.50)
+    ),
+    GaitMode.CREEP_TROT_BACKWARD: GaitParams(
+        x_amps=(x_amp, -x_amp, x_amp, -x_amp),
+        z_amps=(z_amp, -z_amp, -z_amp, z_amp),
+        x_offsets=(45-x_amp/2, 135+x_amp/2, 135-x_amp/2, 45+x_amp/2),
+        z_offsets=(90-h, 90+h, 90+h, 90-h),
+        phase_offsets=(0.50, 0.00, 0.00, 0.50)  # LF i LR w fazie, RF i RR w fazie
+    ),
+    GaitMode.CREEP_TROT_RIGHT: GaitParams(
+        x_amps=(-30, -30, -30, -30),
+        z_amps=(15, -15, -15, 15),
+        x_offsets=(45+x_amp/2, 135+x_amp/2, 135+x_amp/2, 45+x_amp/2),
+        z_offsets=(90, 90, 90, 90),
+        phase_offsets=(0.50, 0.00, 0.00, 0.50)  # LF i LR w fazie, RF i RR w fazie
+    ),
+    GaitMode.CREEP_TROT_LEFT: GaitParams(
+        x_amps=(30, 30, 30, 30),
+        z_amps=(15, -15, -15, 15),
+        x_offsets=(45-x_amp/2, 135-x_amp/2, 135-x_amp/2, 45-x_amp/2),
+        z_offsets=(90, 90, 90, 90),
+        phase_offsets=(0.50, 0.00, 0.00, 0.50)  # LF i LR w fazie, RF i RR w fazie
+    ),
+
+    GaitMode.CREEP_TROT_MOVE_RIGHT: GaitParams(
+        x_amps=(-x_amp, -x_amp, x_amp, x_amp),
+        z_amps=(z_amp, -z_amp, -z_amp, z_amp),
+        x_offsets=(45+x_amp/2, 135+x_amp/2, 135-x_amp/2, 45-x_amp/2),
+        z_offsets=(90-h, 90+h, 90+h, 90-h),
+        phase_offsets=(0.50, 0.00, 0.00, 0.50)
+    ),
+    GaitMode.CREEP_TROT_MOVE_LEFT: GaitParams(
+        x_amps=(x_amp, x_amp, -x_amp, -x_amp),
+        z_amps=(z_amp, -z_amp, -z_amp, z_amp),
+        x_offsets=(45-x_amp/2, 135-x_amp/2, 135+x_amp/2, 45+x_amp/2),
+        z_offsets=(90-h, 90+h, 90+h, 90-h),
+        phase_offsets=(0.50, 0.00, 0.00, 0.50)  # LF i LR w fazie, RF i RR w fazie
+    ),
+
+    # parametry CREEP_TROT_FORWARD/BACKWARD z profilem kłusa (unoszenie i podpór po 50% cyklu)
+    GaitMode.TROT_FORWARD: GaitParams(
+        x_amps=(-x_amp, x_amp, -x_amp, x_amp),
+        z_amps=(z_amp, -z_amp, -z_amp, z_amp),
+        x_offsets=(45+x_amp/2, 135-x_amp/2, 135+x_amp/2, 45-x_amp/2),
+        z_offsets=(90-h, 90+h, 90+h, 90-h),
+        phase_offsets=(0.50, 0.00, 0.00, 0.50),
+        profile=GaitProfile.TROT
+    ),
+    GaitMode.TROT_BACKWARD: GaitParams(
+        x_amps=(x_amp, -x_amp, x_amp, -x_amp),
+        z_amps=(z_amp, -z_amp, -z_amp, z_amp),
+        x_offsets=(45-x_amp/2, 135+x_amp/2, 135-x_amp/2, 45+x_amp/2),
+        z_offsets=(90-h, 90+h, 90+h, 90-h),
+        phase_offsets=(0.50, 0.00, 0.00, 0.50),
+        profile=GaitProfile.TROT
+    )
+}
+
+def creep_profile(phases):
+    # LIFT (0-25% cyklu), potem liniowy powrót z nogą na ziemi
+    lift = phases < 0.25
+    z = np.where(lift, np.sin(phases / 0.25 * np.pi), 0.0)
+    x = np.where(lift, np.sin(phases / 0.25 * np.pi / 2), 1.0 - (phases - 0.25) / 0.75)
+    return z, x
+
+def trot_profile(phases):
+    lift = phases < 0.5
+    z = np.where(lift, np.sin(phases * 2 * np.pi), 0.0)
+    x = np.where(lift, np.sin(phases * np.pi), np.cos((phases - 0.5) * np.pi))
+    return z, x
+
+# profil: funkcja fazy nogi (tablica) -> (z, x) jako ułamek amplitudy
+PROFILES = {
+    GaitProfile.CREEP: creep_profile,
+    GaitProfile.TROT: trot_profile,
+}
+
+def gait_angles(params, phases):
+    # kąty wszystkich nóg dla tablicy faz cyklu, jednym wywołaniem
+    # params: GaitParams albo lista GaitParams (po jednym na fazę)
+    # wynik: tablica (len(phases), 4 nogi wg LEGS, 2 osie wg AXES) w stopniach
+    phases = np.asarray(phases, dtype=float).reshape(-1)
+    stack = [params] if isinstance(params, GaitParams) else list(params)
+    if len(stack) not in (1, len(phases)):
+        raise ValueError(f"{len(stack)} GaitParams for {len(phases)} phases")
+
+    x_amps = np.array([p.x_amps for p in stack], dtype=float)
+    z_amps = np.array([p.z_amps for p in stack], dtype=float)
+    x_offsets = np.array([p.x_offsets for p in stack], dtype=float)
+    z_offsets = np.array([p.z_offsets for p in stack], dtype=float)
+    phase_offsets = np.array([p.phase_offsets for p in stack], dtype=float)
+
+    leg_phases = (phases[:, None] + phase_offsets) % 1.0
+    z = np.empty_like(leg_phases)
+    x = np.empty_like(leg_phases)
+    profiles = np.array([p.profile.value for p in stack])
+    for profile in set(p.profile for p in stack):
+        rows = profiles == profile.value if len(stack) > 1 else slice(None)
+        z[rows], x[rows] = PROFILES[profile](leg_phases[rows])
+
+    angles = np.empty(leg_phases.shape + (len(AXES),))
+    angles[..., 0] = x_offsets + x_amps * x
+    angles[..., 1] = z_offsets + z_amps * z
+    return angles
+
+def gait_cycle(params, samples):
+    # cały cykl chodu próbkowany w samples równych krokach fazy
+    return gait_angles(params, np.arange(samples) / samples)
+
+def angles_to_servo(angles_deg):
+    # wektorowa wersja ST3215.angle_deg_to_servo
+    return 4095 - np.rint(np.radians(angles_deg) * (2048 / np.pi) + 2048).astype(np.int32)
+
+def blend_params(a, b, alpha):
+    # parametry pośrednie: amplitudy i przesunięcia liniowo, przesunięcia fazy po krótszym łuku
+    # (profil z a, patrz blend_angles)
+    lerp = lambda u, v: tuple(float(x + alpha * (y - x)) for x, y in zip(u, v))
+    phases = tuple(float((x + alpha * (((y - x + 0.5) % 1.0) - 0.5)) % 1.0) for x, y in zip(a.phase_offsets, b.phase_offsets))
+    return GaitParams(
+        x_amps=lerp(a.x_amps, b.x_amps),
+        z_amps=lerp(a.z_amps, b.z_amps),
+        x_offsets=lerp(a.x_offsets, b.x_offsets),
+        z_offsets=lerp(a.z_offsets, b.z_offsets),
+        phase_offsets=phases,
+        profile=a.profile
+    )
+
+def blend_angles(a, b, phases, alphas):
+    # kąty w trakcie przejścia a -> b: alphas (0..1) dla każdej fazy
+    # przy różnych profilach wynik obu profili jest mieszany z wagą alpha
+    stack = [blend_params(a, b, alpha) for alpha in alphas]
+    angles = gait_angles(stack, phases)
+    if a.profile != b.profile:
+        other = gait_angles([dataclasses.replace(p, profile=b.profile) for p in stack], phases)
+        weights = np.asarray(alphas, dtype=float)[:, None, None]
+        angles = angles + weights * (other - angles)
+    return angles
+
+def transition_cycles(a, b, samples, cycles):
+    # cycles pełnych cykli przejścia a -> b (płynny start i koniec), faza ciągła z cyklem a i b
+    count = samples * cycles
+    phases = np.arange(count) / samples
+    progress = np.arange(count) / count
+    alphas = progress * progress * (3 - 2 * progress)   # smoothstep
+    return blend_angles(a, b, phases % 1.0, alphas)
+
+def params_fields(params):
+    fields = dataclasses.asdict(params)
+    fields['profile'] = params.profile.name
+    return fields
+
+def gait_table_key(params, t_cycle, dt, mapping, angle_limits, trims, blend=None):
+    # skrót parametrów chodu i kalibracji (zakresy kątów, trymy)
+    description = json.dumps({
+        'version': GAIT_TABLE_VERSION,
+        'params': params_fields(params),
+        'blend': None if blend is None else [params_fields(blend[0]), blend[1]],
+        't_cycle': t_cycle,
+        'dt': dt,
+        'mapping': [list(item) for item in mapping],
+        'angle_limits': {str(id): list(limits) for id, limits in sorted(angle_limits.items())},
+        'trims': {str(id): trim for id, trim in sorted(trims.items())},
+    }, sort_keys=True)
+    return hashlib.sha1(description.encode()).hexdigest()
+
+def servo_table(angles, mapping, angle_limits, trims):
+    # kąty (klatki, nogi, osie) -> tablica (klatki, serwa) pozycji gotowych do wysłania
+    ids = [id for id, _, _ in mapping]
+    columns = [LEGS.index(leg) * len(AXES) + AXES.index(axis) for _, leg, axis in mapping]
+    servo_angles = angles.reshape(len(angles), -1)[:, columns]
+    return ids, servo_positions(servo_angles, ids, angle_limits, trims)
+
+def servo_positions(servo_angles, ids, angle_limits, trims):
+    # kąty (klatki, serwa wg ids) -> pozycje: kąty ograniczone do angle_limits,
+    # przeliczone na kroki serwa, z trymami
+    low = np.array([angle_limits.get(id, (-180, 180))[0] for id in ids], dtype=float)
+    high = np.array([angle_limits.get(id, (-180, 180))[1] for id in ids], dtype=float)
+    for column in np.flatnonzero(((servo_angles < low) | (servo_angles > high)).any(axis=0)):
+        print(f"⚠️ Servo {ids[column]}: kąty poza zakresem {angle_limits.get(ids[column])} — ograniczono.")
+    servo_angles = np.clip(servo_angles, low, high)
+
+    return angles_to_servo(servo_angles) + np.array([trims.get(id, 0) for id in ids], dtype=np.int32)
+
+def compile_gait(params, t_cycle, dt, mapping, angle_limits, trims, blend=None):
+    # jeden pełny cykl jako tablica (klatki, serwa) pozycji gotowych do wysłania
+    # blend=(params docelowe, liczba cykli): przejście params -> params docelowe
+    frames = max(1, int(round(t_cycle / dt)))
+    if blend is None:
+        angles = gait_cycle(params, frames)
+    else:
+        angles = transition_cycles(params, blend[0], frames, blend[1])
+    return servo_table(angles, mapping, angle_limits, trims)
+
+def gait_table(params, t_cycle, dt, mapping, angle_limits, trims, cache_dir = GAIT_CACHE_DIR, blend=None):
+    # compile_gait z pamięcią podręczną w pamięci i w cache_dir (None: tylko w pamięci)
+    key = gait_table_key(params, t_cycle, dt, mapping, angle_limits, trims, blend)
+    if key in gait_tables:
+        return gait_tables[key]
+
+    ids = [id for id, _, _ in mapping]
+    path = os.path.join(cache_dir, key + '.npy') if cache_dir else None
+    table = None
+    if path is not None:
+        try:
+            table = np.load(path)
+        except (OSError, ValueError):
+            table = None
+
+    if table is None or table.ndim != 2 or table.shape[1] != len(ids):
+        ids, table = compile_gait(params, t_cycle, dt, mapping, angle_limits, trims, blend)
+        if path is not None:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                np.save(path, table)
+            except OSError:
+                pass
+
+    gait_tables[key] = (ids, table)
+    return ids, table
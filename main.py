@@ -1,20 +1,17 @@
+import os
 import time
 import math
-from st3215 import ST3215
-from dataclasses import dataclass
-from enum import Enum
+from st3215 import ST3215, ServoBusGroup
+from st3215.values import ROSTER_PATH
+from gait import *
+from control_loop import *
+from choreography import *
 
-servo = ST3215('COM3')
+servo = None  # otwierane przez connect()
 sts_id = [1, 2, 3, 4, 5, 6, 7, 8]
 acc = 250
 speed = 2400
 
-h = 20                      # height
-x_amp = 30                  # x amplitude
-z_amp = 15                  # z amplitude
-offset_front = 0            # front leg offset
-offset_back = 45            # back legs offset
-
 angle_limits = {
     1: (0, 90), 2: (30, 140), 3: (90, 180), 4: (40, 150),
     5: (90, 180), 6: (40, 150), 7: (0, 90), 8: (30, 140)
@@ -56,107 +53,38 @@ RIGHT_POS = {
     5: 120, 6: 90+h, 7: 50, 8: 90-h
 }
 
-for id in sts_id:
-    try:
-        servo.SetMode(id, 0)
-        servo.SetAcceleration(id, acc)
-        servo.SetSpeed(id, speed)
-    except Exception as e:
-        print(f"Error initializing servo {id}: {e}")
-
-class GaitMode(Enum):
-    CREEP_FORWARD = 1
-    CREEP_BACKWARD = 2
-    CREEP_LEFT = 3
-    CREEP_RIGHT = 4
-    CREEP_TROT_FORWARD = 5
-    CREEP_TROT_BACKWARD = 6
-    CREEP_TROT_RIGHT = 7
-    CREEP_TROT_LEFT = 8
-    CREEP_TROT_MOVE_RIGHT = 9
-    CREEP_TROT_MOVE_LEFT = 10
-
-@dataclass
-class GaitParams:
-    x_amps: tuple    
-    z_amps: tuple    
-    x_offsets: tuple 
-    z_offsets: tuple
-    phase_offsets: tuple 
-
-GAIT_CONFIGS = {
-    GaitMode.CREEP_FORWARD: GaitParams(
-        x_amps=(-x_amp, x_amp, -x_amp, x_amp),      # LF, RF, LR, RR
-        z_amps=(z_amp, -z_amp, -z_amp, z_amp),
-        x_offsets=(90 - offset_front, 90 + offset_front, 90 + offset_back, 90 - offset_back),
-        z_offsets=(90-h, 90+h, 90+h, 90-h),
-        phase_offsets=(0.00, 0.50, 0.25, 0.75)
-    ),
-    GaitMode.CREEP_BACKWARD: GaitParams(
-        x_amps=(x_amp, -x_amp, x_amp, -x_amp),
-        z_amps=(z_amp, -z_amp, -z_amp, z_amp),
-        x_offsets=(90 - offset_back, 90 + offset_back, 90 + offset_front, 90 - offset_front),
-        z_offsets=(90-h, 90+h, 90+h, 90-h),
-        phase_offsets=(0.25, 0.75, 0.00, 0.50)
-    ),
-    GaitMode.CREEP_LEFT: GaitParams(
-        x_amps=(x_amp, x_amp, x_amp, x_amp),
-        z_amps=(z_amp, -z_amp, -z_amp, z_amp),
-        x_offsets=(45-x_amp/2, 135-x_amp/2, 135-x_amp/2, 45-x_amp/2),        
-        z_offsets=(90-h, 90+h, 90+h, 90-h),
-        phase_offsets=(0.00, 0.50, 0.25, 0.75)
-    ),
-    GaitMode.CREEP_RIGHT: GaitParams(
-        x_amps=(-x_amp, -x_amp, -x_amp, -x_amp),
-        z_amps=(z_amp, -z_amp, -z_amp, z_amp),
-        x_offsets=(45+x_amp/2, 135+x_amp/2, 135+x_amp/2, 45+x_amp/2),        
-        z_offsets=(90-h, 90+h, 90+h, 90-h),
-        phase_offsets=(0.00, 0.50, 0.25, 0.75)
-    ),
-    GaitMode.CREEP_TROT_FORWARD: GaitParams(
-        x_amps=(-x_amp, x_amp, -x_amp, x_amp),
-        z_amps=(z_amp, -z_amp, -z_amp, z_amp),
-        x_offsets=(45+x_amp/2, 135-x_amp/2, 135+x_amp/2, 45-x_amp/2),
-        z_offsets=(90-h, 90+h, 90+h, 90-h),
-        phase_offsets=(0.50, 0.00, 0.00, 0.50) 
-    ),
-    GaitMode.CREEP_TROT_BACKWARD: GaitParams(
-        x_amps=(x_amp, -x_amp, x_amp, -x_amp),
-        z_amps=(z_amp, -z_amp, -z_amp, z_amp),
-        x_offsets=(45-x_amp/2, 135+x_amp/2, 135-x_amp/2, 45+x_amp/2),
-        z_offsets=(90-h, 90+h, 90+h, 90-h),
-        phase_offsets=(0.50, 0.00, 0.00, 0.50)  # LF i LR w fazie, RF i RR w fazie
-    ),
-    GaitMode.CREEP_TROT_RIGHT: GaitParams(
-        x_amps=(-30, -30, -30, -30),
-        z_amps=(15, -15, -15, 15),
-        x_offsets=(45+x_amp/2, 135+x_amp/2, 135+x_amp/2, 45+x_amp/2),
-        z_offsets=(90, 90, 90, 90),
-        phase_offsets=(0.50, 0.00, 0.00, 0.50)  # LF i LR w fazie, RF i RR w fazie
-    ),
-    GaitMode.CREEP_TROT_LEFT: GaitParams(
-        x_amps=(30, 30, 30, 30),
-        z_amps=(15, -15, -15, 15),
-        x_offsets=(45-x_amp/2, 135-x_amp/2, 135-x_amp/2, 45-x_amp/2),
-        z_offsets=(90, 90, 90, 90),
-        phase_offsets=(0.50, 0.00, 0.00, 0.50)  # LF i LR w fazie, RF i RR w fazie
-    ),
-
-    GaitMode.CREEP_TROT_MOVE_RIGHT: GaitParams(
-        x_amps=(-x_amp, -x_amp, x_amp, x_amp),
-        z_amps=(z_amp, -z_amp, -z_amp, z_amp),
-        x_offsets=(45+x_amp/2, 135+x_amp/2, 135-x_amp/2, 45-x_amp/2),
-        z_offsets=(90-h, 90+h, 90+h, 90-h),
-        phase_offsets=(0.50, 0.00, 0.00, 0.50) 
-    ),
-    GaitMode.CREEP_TROT_MOVE_LEFT: GaitParams(
-        x_amps=(x_amp, x_amp, -x_amp, -x_amp),
-        z_amps=(z_amp, -z_amp, -z_amp, z_amp),
-        x_offsets=(45-x_amp/2, 135-x_amp/2, 135+x_amp/2, 45+x_amp/2),
-        z_offsets=(90-h, 90+h, 90+h, 90-h),
-        phase_offsets=(0.50, 0.00, 0.00, 0.50)  # LF i LR w fazie, RF i RR w fazie
-    )
-}
+def connect(port=None):
+    # port lub URL pyserial, np. 'sim://?ids=1-8' bez robota (domyślnie SPIDER_PORT, potem COM3)
+    # kilka portów rozdzielonych przecinkiem (np. 'COM3,COM4'): serwa podzielone na kilka magistral
+    # poprzednio otwarty port jest zamykany
+    global servo
+    disconnect()
+    ports = (port or os.environ.get('SPIDER_PORT', 'COM3')).split(',')
+    # ostatnio znalezione serwa każdego portu w ROSTER_PATH: szybsze ListServos
+    servo = ST3215(ports[0], ROSTER_PATH) if len(ports) == 1 else ServoBusGroup(ports, ROSTER_PATH)
+    # zapis ruchu na magistrali do pliku, odtwarzanie: SPIDER_PORT='replay://plik.cap'
+    if os.environ.get('SPIDER_CAPTURE') and len(ports) == 1:
+        servo.portHandler.startCapture(os.environ['SPIDER_CAPTURE'])
+
+    for id in sts_id:
+        try:
+            servo.SetMode(id, 0)
+            servo.SetAcceleration(id, acc)
+            servo.SetSpeed(id, speed)
+        except Exception as e:
+            print(f"Error initializing servo {id}: {e}")
+    return servo
+
+def disconnect():
+    global servo
+    if servo is None:
+        return
+    if isinstance(servo, ServoBusGroup):
+        servo.close()
+    else:
+        servo.portHandler.stopCapture()
+        servo.portHandler.closePort()
+    servo = None
 
 def check_angle_limit(id, angle_deg):
     min_angle, max_angle = angle_limits.get(id, (-180, 180))
@@ -184,45 +112,9 @@ def return_to_neutral():
     time.sleep(1)
     print("All servos in neutral position")
 
-def creep_gait(x_amp, z_amp, x_off, z_off, phase):
-    # LIFT (0-25% cyklu)
-    if phase < 0.25:
-        z = z_off + z_amp * math.sin(phase / 0.25 * math.pi)
-        x = x_off + x_amp * math.sin(phase / 0.25 * math.pi / 2)
-    # RETURN (25-100% cyklu) 
-    else:
-        z = z_off  # noga na ziemi
-        normalized_return_phase = (phase - 0.25) / 0.75
-        x = x_off + x_amp * (1 - normalized_return_phase)  # liniowy powrót
-    return z, x
-
-def trot_gait(x_amp, z_amp, x_off, z_off, phase):
-    if phase < 0.5:
-        z = z_off + z_amp * math.sin(phase * 2 * math.pi)
-        x = x_off + x_amp * math.sin(phase * math.pi)
-    else:
-        z = z_off
-        x = x_off + x_amp * math.cos((phase - 0.5) * math.pi)
-    
-    return z, x
-
 def calculate_gait_angles(mode, phase):
-    params = GAIT_CONFIGS[mode]
-    
-    legs = ['lf', 'rf', 'lr', 'rr']
-    angles = {}
-    
-    for i, leg in enumerate(legs):
-        z, x = creep_gait(
-            params.x_amps[i],
-            params.z_amps[i], 
-            params.x_offsets[i],
-            params.z_offsets[i],
-            phase=(phase + params.phase_offsets[i]) % 1.0
-        )
-        angles[leg] = {'x': x, 'z': z}
-    
-    return angles
+    angles = gait_angles(GAIT_CONFIGS[mode], [phase])[0]
+    return {leg: {axis: float(angles[i, j]) for j, axis in enumerate(AXES)} for i, leg in enumerate(LEGS)}
 
 def print_gait_info(step, t, angles, mode):
     if step % 5 == 0:  
@@ -236,237 +128,158 @@ def print_gait_info(step, t, angles, mode):
         
         print(" | ".join(leg_angles))
 
-def hello():
-    HELLO_POS = {
-    1: 45, 2: 30, 3: 135, 4: 150,
-    5: 105, 6: 70, 7: 75, 8: 110}
-
-    for servo_id, angle in HELLO_POS.items():
-        move_servo(servo_id, angle)
-    time.sleep(0.5)
-    move_servo(2, 90)
+CHOREOGRAPHY_POSES = {
+    'neutral': NEUTRAL_ANGLES,
+    'forward': FORWARD_POS,
+    'backward': BACKWARD_POS,
+    'left': LEFT_POS,
+    'right': RIGHT_POS,
+}
 
-    for _ in range(2):
-        move_servo(1, 10)
-        time.sleep(0.5)
+def play_choreography(name, sync=True, dt=0.02, policy=OverrunPolicy.SKIP):
+    # choreografia z pliku (choreographies/<name>.json) skompilowana do klatek całego robota,
+    # odtwarzana w ControlLoop: jedna ramka SYNC_WRITE na takt, interpolacja co dt
+    spec = load_choreography(name)
+    ids, table = compile_choreography(spec, dt, CHOREOGRAPHY_POSES, angle_limits, trims,
+                                      {'h': h, 'x_amp': x_amp, 'z_amp': z_amp})
+    frames = [dict(zip(ids, row)) for row in table.tolist()]
+    sent = [None]
+
+    def tick(step, t):
+        # klatka wg rzeczywistego czasu, ostatnia wysłana zawsze (także po pominiętych taktach)
+        index = min(int(t / dt), len(frames) - 1)
+        if frames[index] != sent[0]:   # w pauzach bez zbędnych ramek
+            push_frame(frames[index], sync)
+            sent[0] = frames[index]
+        if index == len(frames) - 1:
+            return False
+
+    loop = ControlLoop(dt, policy)
+    loop.run(tick)
+    return loop.stats()
 
-        move_servo(1, 60)
-        time.sleep(0.5)
-    time.sleep(0.5)
-    return_to_neutral()
+def hello():
+    play_choreography('hello')
 
 def pushupOneLeg():
-    PUSHUP_POS = {
-    1: 90, 2: 90, 3: 90, 4: 90,
-    5: 135, 6: 110, 7: 45, 8: 70}
-
-    for servo_id, angle in PUSHUP_POS.items():
-        move_servo(servo_id, angle)
-
-    for _ in range(3):
-        move_servo(2, 90)
-        time.sleep(0.7)
-
-        move_servo(2, 30)
-        time.sleep(0.7)
-    move_servo(2, 90)
-
-    for _ in range(3):
-        move_servo(4, 90)
-        time.sleep(0.7)
-
-        move_servo(4, 150)
-        time.sleep(0.7)
-    return_to_neutral()
+    play_choreography('pushup_one_leg')
 
 def pushup():
-    PUSHUP_POS = {
-    1: 90, 2: 90, 3: 90, 4: 90,
-    5: 135, 6: 110, 7: 45, 8: 70}
-
-    for servo_id, angle in PUSHUP_POS.items():
-        move_servo(servo_id, angle)
-
-    for _ in range(3):
-        move_servo(2, 90)
-        move_servo(4, 90)
-        time.sleep(0.7)
-
-        move_servo(2, 30)
-        move_servo(4, 150)
-        time.sleep(0.7)
-    return_to_neutral()
+    play_choreography('pushup')
 
 def sideToSide():
-    for _ in range(3):
-        move_servo(2, 90-h-30)
-        move_servo(4, 90+h-30)
-        move_servo(6, 90+h+30)
-        move_servo(8, 90-h+30)
-        time.sleep(0.5)
-
-        move_servo(2, 90-h+30)
-        move_servo(4, 90+h+30)
-        move_servo(6, 90+h-30)
-        move_servo(8, 90-h-30)
-        time.sleep(0.5)
-
-    return_to_neutral()
+    play_choreography('side_to_side')
 
 def steps():
-    for _ in range(2):
-        move_servo(2, 90-h-30)
-        move_servo(4, 90+h-30)
-        move_servo(6, 90+h-30)
-        move_servo(8, 90-h-30)
-        time.sleep(0.5)
-
-        move_servo(2, 90-h+30)
-        move_servo(4, 90+h+30)
-        move_servo(6, 90+h+30)
-        move_servo(8, 90-h+30)
-        time.sleep(0.5)
-    return_to_neutral()
+    play_choreography('steps')
 
 def sit():
-    move_servo(5, 90)
-    move_servo(7, 90)
-    move_servo(6, 90-10)
-    move_servo(8, 90+10)
-    time.sleep(0.7)
-
-    move_servo(2, 90-40)
-    move_servo(4, 90+40)
-    time.sleep(1.5)
-    return_to_neutral()
+    play_choreography('sit')
 
 def bounce():
-    # down
-    move_servo(2, 90-h+15)
-    move_servo(4, 90+h-15)
-    move_servo(6, 90+h-15)
-    move_servo(8, 90-h+15)
-    time.sleep(0.5)
-
-    # up without 2 leg
-    move_servo(2, 90-h+25)
-    move_servo(4, 90+h+15)
-    move_servo(6, 90+h+15)
-    move_servo(8, 90-h-15)
-    time.sleep(0.5)
-
-    #down
-    move_servo(2, 90-h+15)
-    move_servo(4, 90+h-15)
-    move_servo(6, 90+h-15)
-    move_servo(8, 90-h+15)
-    time.sleep(0.5)
-
-    # up without 4 leg
-    move_servo(2, 90-h-15)
-    move_servo(4, 90+h-25)
-    move_servo(6, 90+h+15)
-    move_servo(8, 90-h-15)
-    time.sleep(0.5)
-
-    #down
-    move_servo(2, 90-h+15)
-    move_servo(4, 90+h-15)
-    move_servo(6, 90+h-15)
-    move_servo(8, 90-h+15)
-    time.sleep(0.5)
-
-    # up without 6 leg
-    move_servo(2, 90-h-15)
-    move_servo(4, 90+h+15)
-    move_servo(6, 90+h-25)
-    move_servo(8, 90-h-15)
-    time.sleep(0.5)
-
-    #down
-    move_servo(2, 90-h+15)
-    move_servo(4, 90+h-15)
-    move_servo(6, 90+h-15)
-    move_servo(8, 90-h+15)
-    time.sleep(0.5)
-
-    # up without 8 leg
-    move_servo(2, 90-h-15)
-    move_servo(4, 90+h+15)
-    move_servo(6, 90+h+15)
-    move_servo(8, 90-h+25)
-    time.sleep(0.5)
-
-    return_to_neutral()
+    play_choreography('bounce')
 
 def sayNo():
-    for _ in range(1):
-        move_servo(1, 75)
-        move_servo(3, 165)
-        move_servo(5, 165)
-        move_servo(7, 75)
-        time.sleep(0.6)
-
-        move_servo(1, 15)
-        move_servo(3, 105)
-        move_servo(5, 105)
-        move_servo(7, 15)
-        time.sleep(0.6)
-
-    return_to_neutral()
+    play_choreography('say_no')
 
 def dive():
-    for _ in range(3):
-        move_servo(1, 75)
-        move_servo(3, 105)
-        move_servo(5, 165)
-        move_servo(7, 15)
-
-        move_servo(2, 90-h-20)
-        move_servo(4, 90+h+20)
-        move_servo(6, 90+h-20)
-        move_servo(8, 90-h+20)
-        time.sleep(0.5)
-
-        move_servo(1, 15)
-        move_servo(3, 165)
-        move_servo(5, 105)
-        move_servo(7, 75)
-
-        move_servo(2, 90-h+20)
-        move_servo(4, 90+h-20)
-        move_servo(6, 90+h+20)
-        move_servo(8, 90-h-20)
-        time.sleep(0.5)
+    play_choreography('dive')
 
-    return_to_neutral()
+def push_frame(frame, sync=True):
+    # klatka z tablicy chodu: pozycje serw już ograniczone, przeliczone i z trymami
+    try:
+        if sync:
+            servo.SyncWritePosition(frame)
+        else:
+            for id, pos in frame.items():
+                servo.WritePosition(id, pos)
+    except Exception as e:
+        print(f"Error moving servos {list(frame)}: {e}")
+
+def print_loop_stats(loop):
+    stats = loop.stats()
+    lateness = stats['lateness_ms'] or {'p50': 0.0, 'p99': 0.0, 'max': 0.0}
+    print(f"Pętla {stats['rate_hz']:.0f} Hz: {stats['achieved_hz']:.1f} Hz | "
+          f"spóźnienie p50 {lateness['p50']:.2f} ms p99 {lateness['p99']:.2f} ms max {lateness['max']:.2f} ms | "
+          f"obciążenie {stats['load']:.0%} | przekroczenia {stats['overruns']}, pominięte {stats['skipped']}")
+
+def gait_frames(mode, dt, t_cycle=1, from_mode=None, blend_cycles=1):
+    # klatki (słowniki id: pozycja) jednego cyklu chodu, skompilowane raz (i zapisane w .gait_cache)
+    # from_mode: klatki przejścia from_mode -> mode przez blend_cycles cykli
+    if from_mode is None:
+        ids, table = gait_table(GAIT_CONFIGS[mode], t_cycle, dt, SERVO_MAPPING, angle_limits, trims)
+    else:
+        ids, table = gait_table(GAIT_CONFIGS[from_mode], t_cycle, dt, SERVO_MAPPING, angle_limits, trims,
+                                blend=(GAIT_CONFIGS[mode], blend_cycles))
+    return [dict(zip(ids, row)) for row in table.tolist()]
 
-def execute_gait(mode):
+def execute_gait(mode, sync=True, steps=None, dt=0.05, policy=OverrunPolicy.SKIP, from_mode=None, blend_cycles=1):
     t_cycle = 1               # czas pełnego cyklu chodu [s]
-    dt = 0.05                   # krok czasowy [s]
-    step = 0
-    
-    try:
-        while True:
-            t = step * dt
+    # dt: krok czasowy [s]
+    # from_mode: chód, który właśnie się skończył (pełnym cyklem) — płynne przejście zamiast
+    # return_to_neutral() i prepareCreep*()
+
+    # w pętli tylko indeksowanie gotowych klatek
+    frames = gait_frames(mode, dt, t_cycle)
+    transition = gait_frames(mode, dt, t_cycle, from_mode, blend_cycles) if from_mode is not None else []
+
+    def tick(step, t):
+        # klatka wg rzeczywistego czasu: po pominiętych taktach chód nie zwalnia
+        index = int(t / dt)
+        if index < len(transition):
+            push_frame(transition[index], sync)
+        else:
+            push_frame(frames[(index - len(transition)) % len(frames)], sync)
+
+        if step % 5 == 0:
             phase = (t / t_cycle) % 1.0  # normalizacja fazy do 0.0-1.0
+            print_gait_info(step, t, calculate_gait_angles(mode, phase), mode)
+
+    # stałe terminy taktów co dt, niezależne od czasu pracy taktu
+    loop = ControlLoop(dt, policy)
+    try:
+        loop.run(tick, steps)   # steps=None: do przerwania (Ctrl+C)
+    except KeyboardInterrupt:
+        print("\nGait interrupted by user")
+        return_to_neutral()
+    finally:
+        print_loop_stats(loop)
+        print("Gait execution completed")
+    return loop.stats()
 
-            angles = calculate_gait_angles(mode, phase)
-            
-            # Użyj globalnego mapping serw
-            for servo_id, leg, axis in SERVO_MAPPING:
-                angle = angles[leg][axis]
-                move_servo(servo_id, angle)
-            
-            print_gait_info(step, t, angles, mode)
-            time.sleep(dt)
-            step += 1
-            
+def execute_gait_sequence(sequence, sync=True, dt=0.05, blend_cycles=1, policy=OverrunPolicy.SKIP):
+    # sequence: lista (GaitMode, liczba cykli); zmiana kierunku płynnym przejściem przez blend_cycles cykli,
+    # bez zatrzymania pętli
+    t_cycle = 1               # czas pełnego cyklu chodu [s]
+    timeline = []             # (tryb, klatka) dla każdego taktu
+    previous = None
+    for mode, cycles in sequence:
+        if previous is not None and previous != mode:
+            timeline += [(mode, frame) for frame in gait_frames(mode, dt, t_cycle, previous, blend_cycles)]
+        timeline += [(mode, frame) for frame in gait_frames(mode, dt, t_cycle)] * cycles
+        previous = mode
+
+    def tick(step, t):
+        index = int(t / dt)
+        if index >= len(timeline):
+            return False
+        mode, frame = timeline[index]
+        push_frame(frame, sync)
+
+        if step % 5 == 0:
+            phase = (t / t_cycle) % 1.0
+            print_gait_info(step, t, calculate_gait_angles(mode, phase), mode)
+
+    loop = ControlLoop(dt, policy)
+    try:
+        loop.run(tick)
     except KeyboardInterrupt:
         print("\nGait interrupted by user")
         return_to_neutral()
     finally:
+        print_loop_stats(loop)
         print("Gait execution completed")
+    return loop.stats()
 
 def prepareCreepForward():
     for servo_id, angle in FORWARD_POS.items():
@@ -489,6 +302,8 @@ def prepareCreepRight():
     time.sleep(0.2)
 
 if __name__ == "__main__":
+    connect()
+
     # execute_gait(GaitMode.CREEP_FORWARD)
     # execute_gait(GaitMode.CREEP_BACKWARD)
     # execute_gait(GaitMode.CREEP_RIGHT)
@@ -515,6 +330,9 @@ if __name__ == "__main__":
     # prepareCreepRight()
     # execute_gait(GaitMode.CREEP_RIGHT)
 
+    # płynna zmiana kierunku bez powrotu do pozycji neutralnej
+    # execute_gait_sequence([(GaitMode.CREEP_FORWARD, 4), (GaitMode.CREEP_LEFT, 2), (GaitMode.CREEP_FORWARD, 4)])
+
     # volt = servo.ReadVoltage(1)
     # print(volt)
 
@@ -5,4 +5,6 @@
 __version__ = "IN_PROGRESS"
 
 from .st3215 import *
+from .async_st3215 import *
+from .bus_group import *
 
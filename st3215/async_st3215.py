@@ -0,0 +1,452 @@
+import asyncio
+
+from .port_handler import *
+from .protocol_packet_handler import *
+from .group_sync_read import *
+from .discovery import BusDiscovery
+from .st3215 import ST3215
+from .values import *
+
+
+__all__ = ['AsyncST3215']
+
+
+class AsyncST3215(object):
+    """
+    asyncio client for ST3215 servos.
+
+    Mirrors the ST3215 API with coroutines. The port is read without blocking: received bytes are
+    pushed to the packet parser by an event loop reader (or a polling task when the port has no
+    file descriptor), and transactions wait for their status packet with await. Coroutines sharing
+    the bus are serialized by an asyncio.Lock; a cancelled transaction releases the bus and
+    discards its partial status packet. Bytes received while no transaction waits for them
+    (late status packets) are discarded.
+    """
+
+    def __init__(self, device):
+
+        self.portHandler = PortHandler(device)
+        self.portHandler.blocking = False
+
+        if not self.portHandler.openPort():
+            raise ValueError(f"Could not open port: {device}")
+
+        self.packetHandler = protocol_packet_handler(self.portHandler)
+        self.parser = self.packetHandler.parser
+
+        self.bus_lock = asyncio.Lock()
+        self.rx_event = asyncio.Event()
+        self.rx_pending = False  # a transaction waits for status packets
+        self.collisions = []
+        self.loop = None
+        self.reader_fd = None
+        self.poll_task = None
+
+    @property
+    def encoder(self):
+        return self.packetHandler.encoder
+
+    def stats(self, reset = False):
+        """
+        Bus counters (see protocol_packet_handler.stats).
+        """
+        return self.packetHandler.stats(reset)
+
+    def startReader(self):
+        loop = asyncio.get_running_loop()
+        if self.loop is loop:
+            return
+
+        self.loop = loop
+        try:
+            self.reader_fd = self.portHandler.ser.fileno()
+            loop.add_reader(self.reader_fd, self.onReadable)
+        except (AttributeError, OSError, ValueError, NotImplementedError):
+            # no pollable file descriptor (Windows, simulated ports): poll the port
+            self.reader_fd = None
+            self.poll_task = loop.create_task(self.pollPort())
+
+    def onReadable(self):
+        if not self.rx_pending or self.parser.free() == 0:
+            # late status packet (timed out or cancelled transaction), or parser full: drain the port,
+            # otherwise the reader is called again at once
+            self.portHandler.readPort(max(self.portHandler.getBytesAvailable(), 1))
+            return
+
+        data = self.portHandler.readPort(self.parser.free())
+        if data:
+            self.parser.feed(data)
+            self.rx_event.set()
+
+    async def pollPort(self):
+        while True:
+            self.onReadable()
+            await asyncio.sleep(ASYNC_POLL_PERIOD)
+
+    def close(self):
+        if self.loop is not None:
+            if self.reader_fd is not None:
+                self.loop.remove_reader(self.reader_fd)
+            if self.poll_task is not None:
+                self.poll_task.cancel()
+            self.loop = None
+        self.portHandler.closePort()
+
+    def startRx(self):
+        # status packets are expected from now on: bytes still in the parser are stale
+        self.parser.clear()
+        self.rx_pending = True
+
+    def stopRx(self):
+        # the replies arriving after the end of the transaction (timeout, cancellation) are discarded
+        self.rx_pending = False
+        self.parser.clear()
+
+    async def rxPacket(self, sts_id, packet_length = None):
+        # status packets of other servos, or of the same servo with another LENGTH
+        # (late ack of a timed out write), are skipped
+        while True:
+            rxpacket, result = self.parser.nextPacket()
+            if result == COMM_RX_WAITING:
+                self.rx_event.clear()
+                await self.rx_event.wait()
+                continue
+
+            if result != COMM_SUCCESS or sts_id is None:
+                return rxpacket, result
+            if rxpacket[PKT_ID] == sts_id and (packet_length is None or rxpacket[PKT_LENGTH] == packet_length - 4):
+                return rxpacket, result
+
+    async def txRxPacket(self, txpacket, packet_length = 6):
+        """
+        Send an instruction packet and wait for its status packet.
+
+        :param txpacket: encoded instruction packet
+        :param packet_length: expected status packet length
+
+        :return: status packet, communication result and servo error
+        """
+        self.startReader()
+
+        # too long packet, or data shorter than its declared length
+        if txpacket is None:
+            self.portHandler.stats.transaction(None, BROADCAST_ID, COMM_TX_ERROR)
+            return None, COMM_TX_ERROR, 0
+
+        # the encoder buffers are shared by all the coroutines of the thread
+        txpacket = bytes(txpacket)
+
+        stats = self.portHandler.stats
+        instruction = txpacket[PKT_INSTRUCTION]
+        async with self.bus_lock:
+            sts_id = txpacket[PKT_ID]
+            if sts_id == BROADCAST_ID:
+                if self.portHandler.writePort(txpacket) != len(txpacket):
+                    stats.transaction(instruction, sts_id, COMM_TX_FAIL)
+                    return None, COMM_TX_FAIL, 0
+                stats.transaction(instruction, sts_id, COMM_SUCCESS)
+                return None, COMM_SUCCESS, 0
+
+            self.startRx()
+            try:
+                if self.portHandler.writePort(txpacket) != len(txpacket):
+                    stats.transaction(instruction, sts_id, COMM_TX_FAIL)
+                    return None, COMM_TX_FAIL, 0
+
+                self.portHandler.setPacketTimeout(packet_length, sts_id)
+                try:
+                    rxpacket, result = await asyncio.wait_for(self.rxPacket(sts_id, packet_length),
+                                                              self.portHandler.packet_timeout / 1000.0)
+                except asyncio.TimeoutError:
+                    result = COMM_RX_TIMEOUT if self.parser.isEmpty() else COMM_RX_CORRUPT
+                    self.portHandler.packetLost()
+                    stats.transaction(instruction, sts_id, result)
+                    return None, result, 0
+            finally:
+                self.stopRx()
+
+            if result != COMM_SUCCESS:
+                stats.transaction(instruction, sts_id, result)
+                return None, result, 0
+
+            stats.transaction(instruction, sts_id, result, self.portHandler.getTimeSinceStart())
+            self.portHandler.packetReceived()
+            return rxpacket, result, rxpacket[PKT_ERROR]
+
+    async def readTxRx(self, sts_id, address, length):
+        if sts_id >= BROADCAST_ID:
+            return [], COMM_NOT_AVAILABLE, 0
+
+        rxpacket, result, error = await self.txRxPacket(self.encoder.read(sts_id, address, length), length + 6)
+        if result != COMM_SUCCESS:
+            return [], result, error
+
+        return rxpacket[PKT_PARAMETER0: PKT_PARAMETER0 + length], result, error
+
+    async def read1ByteTxRx(self, sts_id, address):
+        data, result, error = await self.readTxRx(sts_id, address, 1)
+        data_read = data[0] if (result == COMM_SUCCESS) else 0
+        return data_read, result, error
+
+    async def read2ByteTxRx(self, sts_id, address):
+        data, result, error = await self.readTxRx(sts_id, address, 2)
+        data_read = self.packetHandler.sts_makeword(data[0], data[1]) if (result == COMM_SUCCESS) else 0
+        return data_read, result, error
+
+    async def writeTxRx(self, sts_id, address, length, data):
+        _, result, error = await self.txRxPacket(self.encoder.write(sts_id, address, length, data))
+        return result, error
+
+    async def syncWriteTxOnly(self, start_address, data_length, param, param_length):
+        txpacket = self.encoder.sync(INST_SYNC_WRITE, start_address, data_length, param, param_length)
+        if txpacket is None:
+            return COMM_TX_ERROR
+
+        _, result, _ = await self.txRxPacket(txpacket)
+        return result
+
+    async def syncReadTxRx(self, start_address, data_length, sts_ids, timeout = None):
+        """
+        Sync read of a register block.
+
+        :param timeout: timeout in ms (facultative, transmission time of the status packets + LATENCY_TIMER by default)
+
+        :return: communication result and dict {servo ID: [Error, data...]} of the servos that answered
+        """
+        self.startReader()
+
+        txpacket = self.encoder.sync(INST_SYNC_READ, start_address, data_length, sts_ids, len(sts_ids))
+        if txpacket is None:
+            return COMM_TX_ERROR, {}
+        txpacket = bytes(txpacket)
+
+        data = {}
+        async with self.bus_lock:
+            self.startRx()
+            if self.portHandler.writePort(txpacket) != len(txpacket):
+                self.stopRx()
+                self.portHandler.stats.transaction(INST_SYNC_READ, BROADCAST_ID, COMM_TX_FAIL)
+                return COMM_TX_FAIL, data
+
+            if timeout is None:
+                self.portHandler.setPacketTimeout((6 + data_length) * len(sts_ids))
+            else:
+                self.portHandler.setPacketTimeoutMillis(timeout)
+            deadline = self.portHandler.packet_timeout / 1000.0
+            loop = asyncio.get_running_loop()
+            end = loop.time() + deadline
+            received = 0
+            result = COMM_SUCCESS
+            try:
+                while received < len(sts_ids):
+                    remaining = end - loop.time()
+                    rxpacket, rx_result = await asyncio.wait_for(self.rxPacket(None), max(remaining, 0))
+                    if rx_result != COMM_SUCCESS:
+                        result = COMM_RX_CORRUPT
+                        continue
+                    if rxpacket[PKT_ID] not in sts_ids or rxpacket[PKT_LENGTH] != (data_length + 2):
+                        continue
+
+                    received += 1
+                    data[rxpacket[PKT_ID]] = rxpacket[PKT_ERROR: PKT_PARAMETER0 + data_length]
+                    self.portHandler.stats.servoResult(rxpacket[PKT_ID], rx_result)
+            except asyncio.TimeoutError:
+                # missing servos (timeout) or a truncated packet (corrupt)
+                if not self.parser.isEmpty():
+                    result = COMM_RX_CORRUPT
+                elif result == COMM_SUCCESS:
+                    result = COMM_RX_TIMEOUT
+            finally:
+                self.stopRx()
+
+            self.portHandler.stats.transaction(INST_SYNC_READ, BROADCAST_ID, result,
+                                               self.portHandler.getTimeSinceStart() if result == COMM_SUCCESS else None)
+
+        return result, data
+
+    async def ping(self, sts_id):
+        model_number = 0
+
+        if sts_id >= BROADCAST_ID:
+            return model_number, COMM_NOT_AVAILABLE, 0
+
+        _, result, error = await self.txRxPacket(self.encoder.ping(sts_id))
+        if result == COMM_SUCCESS:
+            model_number, result, error = await self.read2ByteTxRx(sts_id, STS_MODEL_L)
+
+        return model_number, result, error
+
+    async def PingServo(self, sts_id):
+        """
+        Check the presence of a servo.
+
+        :param sts_id: Servo ID
+
+        :return: True in case of success otherwise False
+        """
+        model, comm, error = await self.ping(sts_id)
+        if comm != COMM_SUCCESS or model == 0 or error != 0:
+            return False
+        return True
+
+    async def ListServos(self):
+        """
+        Scan the bus to determine all servo present, with grouped sync reads (see BusDiscovery).
+        IDs answered by several servos are not listed, they are stored in self.collisions.
+
+        :return: A list of servo ID
+        """
+        discovery = BusDiscovery(self.packetHandler)
+        steps = discovery.steps(range(0, BROADCAST_ID))
+        try:
+            group = next(steps)
+            while True:
+                result, data = await self.syncReadTxRx(STS_MODEL_L, 2, group, discovery.timeout(len(group)))
+                group = steps.send((result, data))
+        except StopIteration as stop:
+            found, self.collisions = stop.value
+
+        return sorted(found)
+
+    async def ReadPosition(self, sts_id):
+        """
+        Get the current position
+
+        :param sts_id: Servo ID
+
+        :return: position in case of success, otherwise None
+        """
+        position, comm, error = await self.read2ByteTxRx(sts_id, STS_PRESENT_POSITION_L)
+        if comm == 0 and error == 0:
+            return position
+        else:
+            return None
+
+    async def WritePosition(self, sts_id, position):
+        txpacket = [self.packetHandler.sts_lobyte(position), self.packetHandler.sts_hibyte(position)]
+        comm, error = await self.writeTxRx(sts_id, STS_GOAL_POSITION_L, len(txpacket), txpacket)
+        if comm == 0 and error == 0:
+            return True
+        else:
+            return None
+
+    async def SetMode(self, sts_id, mode):
+        """
+        Configure the operational mode for the servo (Position, rotating, PWM, step)
+
+        :param sts_id: Servo ID
+        :param mode: Mode ID (0, 1, 2 or 3 - Cf register values)
+
+        :return: True if the configuration a been succesfully set. None in case of error.
+        """
+        comm, error = await self.writeTxRx(sts_id, STS_MODE, 1, [mode])
+        if comm == 0 and error == 0:
+            return True
+        else:
+            return None
+
+    async def SetAcceleration(self, sts_id, acc):
+        """
+        Configure the Acceleration value for the servo
+
+        :param sts_id: Servo ID
+        :param acc: Acceleration value (0-254). Unit: 100 step/s^2)
+
+        :return: True if the configuration a been succesfully set. None in case of error.
+        """
+        comm, error = await self.writeTxRx(sts_id, STS_ACC, 1, [acc])
+        if comm == 0 and error == 0:
+            return True
+        else:
+            return None
+
+    async def SetSpeed(self, sts_id, speed):
+        """
+        Configure the Speed value for the servo
+
+        :param sts_id: Servo ID
+        :param speed: Speed value (0-3400). Unit: Step/s
+
+        :return: True if the configuration a been succesfully set. None in case of error.
+        """
+        txpacket = [self.packetHandler.sts_lobyte(speed), self.packetHandler.sts_hibyte(speed)]
+        comm, error = await self.writeTxRx(sts_id, STS_GOAL_SPEED_L, len(txpacket), txpacket)
+        if comm == 0 and error == 0:
+            return True
+        else:
+            return None
+
+    async def MoveTo(self, sts_id, position, speed = 2400, acc = 50, wait = False):
+        """
+        Move the servo to a pre defined position
+
+        :param sts_id: Servo ID
+        :param position: New position of the Servo
+        :param speed: Move speed in step/s (facultative, 2400 by default)
+        :param acc: Accelaration speed in step/s² (facultative, 50 by default)
+        :param wait: Wait the position to be reached before the coroutine return (facultative, False by default)
+
+        :return: True. None in case of error.
+        """
+        if await self.SetMode(sts_id, 0) is None:
+            return None
+        if await self.SetAcceleration(sts_id, acc) is None:
+            return None
+        if await self.SetSpeed(sts_id, speed) is None:
+            return None
+
+        curr_pos = await self.ReadPosition(sts_id) if wait else None
+
+        if await self.WritePosition(sts_id, position) is None:
+            return None
+
+        if wait and curr_pos is not None:
+            await asyncio.sleep(ST3215.estimateMoveTime(abs(position - curr_pos), speed, acc))
+
+        return True
+
+    async def SyncWritePosition(self, positions):
+        """
+        Write the goal position of several servos with a single sync write packet.
+        The packet is broadcasted, so no status packet is awaited.
+
+        :param positions: dict {servo ID: position}
+
+        :return: True in case of success, None in case of error.
+        """
+        param = []
+        for sts_id, position in positions.items():
+            param.extend([sts_id, self.packetHandler.sts_lobyte(position), self.packetHandler.sts_hibyte(position)])
+
+        comm = await self.syncWriteTxOnly(STS_GOAL_POSITION_L, 2, param, len(param))
+        if comm == COMM_SUCCESS:
+            return True
+        else:
+            return None
+
+    async def ReadAll(self, sts_ids, fields = TELEMETRY_FIELDS):
+        """
+        Read the telemetry of several servos in a single sync read transaction (Cf ST3215.ReadAll).
+
+        :param sts_ids: list of servo ID
+        :param fields: list of fields to decode (facultative, all of TELEMETRY_FIELDS by default)
+
+        :return: dict {servo ID: dict {field: value}}. The servo entry is None in case of error.
+        """
+        groupSyncRead = GroupSyncRead(self.packetHandler, STS_PRESENT_POSITION_L, STS_PRESENT_CURRENT_H - STS_PRESENT_POSITION_L + 1)
+        for sts_id in sts_ids:
+            groupSyncRead.addParam(sts_id)
+
+        _, data = await self.syncReadTxRx(groupSyncRead.start_address, groupSyncRead.data_length, list(sts_ids))
+        groupSyncRead.data_dict.update(data)
+
+        telemetry = {}
+        for sts_id in sts_ids:
+            available, error = groupSyncRead.isAvailable(sts_id, STS_PRESENT_POSITION_L, groupSyncRead.data_length)
+            if not available or error != 0:
+                telemetry[sts_id] = None
+                continue
+
+            telemetry[sts_id] = {field: ST3215.decodeTelemetry(groupSyncRead, sts_id, field) for field in fields}
+
+        return telemetry
@@ -0,0 +1,317 @@
+import concurrent.futures
+
+from .st3215 import ST3215
+from .values import *
+
+
+__all__ = ['ServoBusGroup']
+
+
+# ST3215 methods taking a servo ID as first argument, forwarded to the port of the servo
+PER_SERVO_METHODS = (
+    'PingServo', 'ReadLoad', 'ReadVoltage', 'ReadCurrent', 'ReadTemperature', 'ReadAccelaration', 'ReadMode',
+    'ReadCorrection', 'IsMoving', 'ReadStatus', 'ReadPosition', 'ReadSpeed', 'getBlockPosition',
+    'SetAcceleration', 'SetSpeed', 'StopServo', 'StartServo', 'SetMode', 'CorrectPosition', 'Rotate',
+    'DefineMiddle', 'TareServo', 'MoveTo', 'StageMove', 'WritePosition', 'SetResponseLevel',
+    'LockEprom', 'UnLockEprom', 'writeRegister', 'writeCached', 'readRegister',
+)
+
+
+class ServoBusGroup(object):
+    """
+    Servos spread over several serial ports, one half duplex bus per USB adapter.
+
+    Each port has its own ST3215 and a single I/O worker thread: every transaction of a port runs
+    on its worker, so the ports work in parallel while each bus is used by one thread at a time.
+    Servo IDs are routed to their port; a per servo method (PER_SERVO_METHODS: MoveTo,
+    ReadPosition...) is forwarded to the ST3215 of its port. Bus wide methods have their own
+    implementation below, other ST3215 attributes are reached through buses. Sync writes and sync reads across
+    servos of several ports are split into one transaction per port, run at the same time:
+    they complete in the time of the slowest port.
+    """
+
+    def __init__(self, devices, roster_path = None):
+        """
+        :param devices: list of ports (or pyserial URLs), the servos of each port are found by ListServos.
+          Or dict {port: list of servo ID} when the servos are known.
+        :param roster_path: roster file of the ports (see ST3215.ListServos, facultative, no roster by default)
+        """
+        self.buses = {}  # port: ST3215
+        self.workers = {}  # port: single thread executor
+        self.routes = {}  # sts_id: port
+
+        try:
+            for device in devices:
+                self.buses[device] = ST3215(device, roster_path)
+                self.workers[device] = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"st3215 {device}")
+
+            if isinstance(devices, dict):
+                servos = devices
+            else:
+                servos = self.parallel({device: (bus.ListServos,) for device, bus in self.buses.items()})
+
+            for device, sts_ids in servos.items():
+                for sts_id in sts_ids:
+                    if sts_id in self.routes:
+                        raise ValueError(f"Servo {sts_id} found on {self.routes[sts_id]} and {device}")
+                    self.routes[sts_id] = device
+        except Exception:
+            self.close()
+            raise
+
+    # angle conversions, independent of the port
+    rad_to_servo = ST3215.rad_to_servo
+    angle_deg_to_servo = ST3215.angle_deg_to_servo
+
+    def close(self):
+        for worker in self.workers.values():
+            worker.shutdown()
+        for bus in self.buses.values():
+            bus.portHandler.closePort()
+        self.workers = {}
+        self.buses = {}
+
+    def route(self, sts_id):
+        """
+        :return: ST3215 of the port of the servo. None when the servo is unknown.
+        """
+        device = self.routes.get(sts_id)
+        if device is None:
+            return None
+        return self.buses[device]
+
+    def split(self, sts_ids):
+        """
+        :param sts_ids: list of servo ID, or dict {servo ID: value}
+
+        :return: dict {port: list of servo ID}, or dict {port: dict {servo ID: value}}. None when a servo is unknown.
+        """
+        shards = {}
+        for sts_id in sts_ids:
+            device = self.routes.get(sts_id)
+            if device is None:
+                return None
+            if isinstance(sts_ids, dict):
+                shards.setdefault(device, {})[sts_id] = sts_ids[sts_id]
+            else:
+                shards.setdefault(device, []).append(sts_id)
+        return shards
+
+    def submit(self, device, function, *args, **kwargs):
+        return self.workers[device].submit(function, *args, **kwargs)
+
+    def parallel(self, calls):
+        """
+        Run one call per port, each one on the worker of its port.
+
+        :param calls: dict {port: (function, arguments...)}
+
+        :return: dict {port: result}
+        """
+        futures = {device: self.submit(device, *call) for device, call in calls.items()}
+        return {device: future.result() for device, future in futures.items()}
+
+    def __getattr__(self, name):
+        # per servo methods of ST3215: method(sts_id, ...) runs on the worker of the servo port
+        if name not in PER_SERVO_METHODS:
+            raise AttributeError(f"'ServoBusGroup' object has no attribute '{name}' "
+                                 f"(not a per servo method, use the ST3215 of a port: buses[port].{name})")
+
+        def call(sts_id, *args, **kwargs):
+            bus = self.route(sts_id)
+            if bus is None:
+                return None
+            return self.submit(self.routes[sts_id], getattr(bus, name), sts_id, *args, **kwargs).result()
+
+        return call
+
+    @property
+    def write_ack(self):
+        """
+        Write acknowledgement policy of the ports (see ST3215.write_ack), set on all of them at once.
+        """
+        return next(iter(self.buses.values())).write_ack
+
+    @write_ack.setter
+    def write_ack(self, ack):
+        for bus in self.buses.values():
+            bus.write_ack = ack
+
+    @property
+    def collisions(self):
+        """
+        IDs answered by several servos during the last scan of each port (see ST3215.ListServos).
+        """
+        return sorted(sts_id for bus in self.buses.values() for sts_id in bus.collisions)
+
+    def ChangeId(self, sts_id, new_id):
+        """
+        Change the ID of a servo (see ST3215.ChangeId), the servo keeps its port.
+
+        :return: None in case of success, the error text otherwise.
+        """
+        if new_id in self.routes:
+            return f"ID {new_id} is already used on {self.routes[new_id]}"
+
+        device = self.routes.get(sts_id)
+        if device is None:
+            return f"Could not find servo: {sts_id}"
+
+        error = self.submit(device, self.buses[device].ChangeId, sts_id, new_id).result()
+        if error is None:
+            del self.routes[sts_id]
+            self.routes[new_id] = device
+        return error
+
+    def InvalidateCache(self, sts_id = None):
+        """
+        Forget the shadow and the cached registers of a servo (see ST3215.InvalidateCache).
+
+        :param sts_id: Servo ID (facultative, all the servos of all the ports by default)
+        """
+        if sts_id is None:
+            self.parallel({device: (bus.InvalidateCache,) for device, bus in self.buses.items()})
+        elif sts_id in self.routes:
+            self.submit(self.routes[sts_id], self.route(sts_id).InvalidateCache, sts_id).result()
+
+    def ListServos(self):
+        """
+        :return: A list of the servo ID of all the ports
+        """
+        return sorted(self.routes)
+
+    def SyncWritePosition(self, positions):
+        """
+        Write the goal position of several servos, one sync write packet per port.
+
+        :param positions: dict {servo ID: position}
+
+        :return: True in case of success, None in case of error.
+        """
+        return self.shardedWrite("SyncWritePosition", positions)
+
+    def MoveMany(self, moves, wait = False):
+        """
+        Move several servos, each one with its own speed and acceleration (see ST3215.MoveMany).
+
+        :param moves: dict {servo ID: (position, speed, acc)}
+        :param wait: Wait the end of the slowest move before the function return (facultative, False by default)
+
+        :return: True. None in case of error.
+        """
+        return self.shardedWrite("MoveMany", moves, wait)
+
+    def StageMany(self, moves, ack = None):
+        """
+        Register the moves of several servos (see ST3215.StageMove), started together by TriggerStaged.
+
+        :param moves: dict {servo ID: (position, speed, acc)}
+        :param ack: write acknowledgement policy (facultative, write_ack of each port by default)
+
+        :return: True. None in case of error.
+        """
+        return self.shardedWrite("StageMany", moves, ack)
+
+    def TriggerStaged(self):
+        """
+        Start the staged moves of all the ports, one broadcast ACTION per port sent at the same time.
+
+        :return: True. None in case of error.
+        """
+        results = self.parallel({device: (bus.TriggerStaged,) for device, bus in self.buses.items()})
+        if any(result is None for result in results.values()):
+            return None
+        return True
+
+    def shardedWrite(self, name, items, *args):
+        shards = self.split(items)
+        if shards is None:
+            return None
+
+        results = self.parallel({device: (getattr(self.buses[device], name), shard) + args for device, shard in shards.items()})
+        if any(result is None for result in results.values()):
+            return None
+        return True
+
+    def ReadAll(self, sts_ids, fields = TELEMETRY_FIELDS):
+        """
+        Read the telemetry of several servos, one sync read transaction per port.
+
+        :param sts_ids: list of servo ID
+        :param fields: list of fields to decode (facultative, all of TELEMETRY_FIELDS by default)
+
+        :return: dict {servo ID: dict {field: value}}. The servo entry is None in case of error (or unknown servo).
+        """
+        telemetry = {sts_id: None for sts_id in sts_ids if sts_id not in self.routes}
+        shards = self.split([sts_id for sts_id in sts_ids if sts_id in self.routes])
+
+        results = self.parallel({device: (self.buses[device].ReadAll, shard, fields) for device, shard in shards.items()})
+        for result in results.values():
+            telemetry.update(result)
+
+        return {sts_id: telemetry[sts_id] for sts_id in sts_ids}
+
+    def ReadRegisters(self, requests, depth = PIPELINE_DEPTH):
+        """
+        Pipelined register reads (see ST3215.ReadRegisters), the requests of each port run at the same time.
+
+        :param requests: list of (servo ID, address, length)
+        :param depth: maximum number of READ instructions waiting for their status packet, per port (facultative)
+
+        :return: list of values, in the order of requests. None in case of error (or unknown servo).
+        """
+        shards = {}  # port: list of request index
+        for index, request in enumerate(requests):
+            if request[0] in self.routes:
+                shards.setdefault(self.routes[request[0]], []).append(index)
+
+        results = self.parallel({device: (self.buses[device].ReadRegisters, [requests[index] for index in indexes], depth)
+                                 for device, indexes in shards.items()})
+        values = [None] * len(requests)
+        for device, indexes in shards.items():
+            for index, value in zip(indexes, results[device]):
+                values[index] = value
+
+        return values
+
+    def VerifyWrites(self):
+        """
+        Read back the registers written with WRITE_ACK_VERIFY on every port (see ST3215.VerifyWrites).
+
+        :return: list of (servo ID, address) whose value does not match (or could not be read)
+        """
+        results = self.parallel({device: (bus.VerifyWrites,) for device, bus in self.buses.items()})
+        return [mismatch for mismatches in results.values() for mismatch in mismatches]
+
+    def DetectBaudRate(self, sts_ids = None):
+        """
+        Look for servos at every baud rate on every port at the same time (see ST3215.DetectBaudRate).
+        Servos found this way are not routed, create a new group once the bus speeds are fixed.
+
+        :param sts_ids: list of servo ID to look for (facultative, the whole ID range by default)
+
+        :return: dict {port: dict {baud rate: list of servo ID}}
+        """
+        return self.parallel({device: (bus.DetectBaudRate, sts_ids) for device, bus in self.buses.items()})
+
+    def UpgradeBus(self, sts_ids = None, baudrate = 1000000):
+        """
+        Move each port and its servos to its highest reliable baud rate, all the ports at the same time
+        (see ST3215.UpgradeBus).
+
+        :param sts_ids: list of servo ID (facultative, all the servos of the group by default)
+        :param baudrate: highest baud rate to try (facultative, 1 Mbps by default)
+
+        :return: dict {port: baud rate of the bus, None in case of error}. None when a servo is unknown.
+        """
+        shards = self.split(self.routes if sts_ids is None else sts_ids)
+        if shards is None:
+            return None
+
+        return self.parallel({device: (self.buses[device].UpgradeBus, shard, baudrate) for device, shard in shards.items()})
+
+    def stats(self, reset = False):
+        """
+        :return: dict {port: bus statistics} (see protocol_packet_handler.stats)
+        """
+        return {device: bus.stats(reset) for device, bus in self.buses.items()}
@@ -0,0 +1,97 @@
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+from .values import *
+
+
+class BusScheduler(object):
+    """
+    Bus arbitration between threads.
+
+    A thread must own the bus for the whole transaction (instruction packet and status packet).
+    Threads waiting for the bus are queued by priority (PRIORITY_CONTROL before PRIORITY_TELEMETRY),
+    then by arrival order. A request can have a timeout: when it has not been granted the bus
+    in time, it is dropped from the queue and acquire() returns False.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition(threading.Lock())
+        self.queue = []  # heap of [priority, order, deadline]
+        self.order = itertools.count()
+        self.owner = None
+        self.local = threading.local()
+
+    def isBusy(self):
+        return self.owner is not None
+
+    @contextmanager
+    def options(self, priority = None, timeout = None):
+        """
+        Override the priority and/or set a timeout (in ms) for the transactions made by
+        the current thread inside the with block.
+
+        :param priority: PRIORITY_CONTROL or PRIORITY_TELEMETRY (facultative)
+        :param timeout: maximum time to wait for the bus, in ms (facultative)
+        """
+        previous = getattr(self.local, "options", (None, None))
+        self.local.options = (priority, timeout)
+        try:
+            yield
+        finally:
+            self.local.options = previous
+
+    def acquire(self, priority):
+        """
+        Wait for the bus.
+
+        :param priority: default priority of the transaction, overridden by options()
+
+        :return: True when the bus is owned by the current thread, False if the request was dropped.
+        """
+        forced_priority, timeout = getattr(self.local, "options", (None, None))
+        if forced_priority is not None:
+            priority = forced_priority
+
+        me = threading.get_ident()
+
+        with self.condition:
+            if self.owner is None and not self.queue:
+                self.owner = me
+                return True
+
+            deadline = None if timeout is None else time.monotonic() + timeout / 1000.0
+            entry = [priority, next(self.order), deadline]
+            heapq.heappush(self.queue, entry)
+
+            while True:
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        # stale request
+                        self.queue.remove(entry)
+                        heapq.heapify(self.queue)
+                        self.condition.notify_all()
+                        return False
+
+                if self.owner is None and self.queue[0] is entry:
+                    heapq.heappop(self.queue)
+                    self.owner = me
+                    return True
+
+                self.condition.wait(remaining)
+
+    def release(self):
+        """
+        Release the bus if it is owned by the current thread.
+        """
+        with self.condition:
+            if self.owner != threading.get_ident():
+                return
+
+            self.owner = None
+            if self.queue:
+                self.condition.notify_all()
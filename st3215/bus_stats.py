@@ -0,0 +1,122 @@
+import bisect
+import time
+
+from .values import *
+
+
+INSTRUCTION_NAMES = {
+    INST_PING: "PING",
+    INST_READ: "READ",
+    INST_WRITE: "WRITE",
+    INST_REG_WRITE: "REG_WRITE",
+    INST_ACTION: "ACTION",
+    INST_SYNC_WRITE: "SYNC_WRITE",
+    INST_SYNC_READ: "SYNC_READ",
+}
+
+RESULT_NAMES = {
+    COMM_SUCCESS: "COMM_SUCCESS",
+    COMM_PORT_BUSY: "COMM_PORT_BUSY",
+    COMM_TX_FAIL: "COMM_TX_FAIL",
+    COMM_RX_FAIL: "COMM_RX_FAIL",
+    COMM_TX_ERROR: "COMM_TX_ERROR",
+    COMM_RX_WAITING: "COMM_RX_WAITING",
+    COMM_RX_TIMEOUT: "COMM_RX_TIMEOUT",
+    COMM_RX_CORRUPT: "COMM_RX_CORRUPT",
+    COMM_NOT_AVAILABLE: "COMM_NOT_AVAILABLE",
+}
+
+
+class BusStats(object):
+    """
+    Counters of a bus: instruction packets and bytes on the wire, transaction results
+    (per COMM_* code and per servo) and status packet latency histograms per instruction.
+
+    Recording only increments counters, without lock (a snapshot taken while another thread
+    is recording may be off by one transaction). Names are resolved by snapshot() only.
+    """
+
+    def __init__(self, buckets = STATS_LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.reset()
+
+    def reset(self):
+        self.start_time = time.monotonic()
+        self.tx_bytes = 0
+        self.rx_bytes = 0
+        self.sent = {}  # instruction: instruction packets
+        self.results = {}  # COMM_*: transactions
+        self.servos = {}  # sts_id: {COMM_*: transactions}
+        self.latency = {}  # instruction: [count, total, max, histogram]
+
+    def packetSent(self, packet, length):
+        self.tx_bytes += length
+        instruction = packet[PKT_INSTRUCTION]
+        self.sent[instruction] = self.sent.get(instruction, 0) + 1
+
+    def transaction(self, instruction, sts_id, result, latency = None):
+        """
+        Record the end of a transaction.
+
+        :param instruction: INST_*
+        :param sts_id: Servo ID (BROADCAST_ID for sync read/write)
+        :param result: COMM_*
+        :param latency: status packet latency in ms (facultative)
+        """
+        self.results[result] = self.results.get(result, 0) + 1
+
+        if sts_id != BROADCAST_ID:
+            self.servoResult(sts_id, result)
+
+        if latency is not None:
+            entry = self.latency.get(instruction)
+            if entry is None:
+                entry = self.latency[instruction] = [0, 0.0, 0.0, [0] * (len(self.buckets) + 1)]
+            entry[0] += 1
+            entry[1] += latency
+            if latency > entry[2]:
+                entry[2] = latency
+            entry[3][bisect.bisect_left(self.buckets, latency)] += 1
+
+    def servoResult(self, sts_id, result):
+        # per servo count only (status packets of a sync read)
+        servo = self.servos.get(sts_id)
+        if servo is None:
+            servo = self.servos[sts_id] = {}
+        servo[result] = servo.get(result, 0) + 1
+
+    def snapshot(self):
+        """
+        :return: dict of the counters, with instruction and COMM_* names as keys
+        """
+        def results(counts):
+            return {RESULT_NAMES.get(result, str(result)): count for result, count in dict(counts).items()}
+
+        # copies first: the counters may be updated by another thread
+        sent = dict(self.sent)
+        latency = dict(self.latency)
+
+        instructions = {}
+        for instruction in set(sent) | set(latency):
+            name = INSTRUCTION_NAMES.get(instruction, str(instruction))
+            instructions[name] = {"sent": sent.get(instruction, 0)}
+
+            entry = latency.get(instruction)
+            if entry is not None:
+                count, total, maximum, histogram = entry[0], entry[1], entry[2], list(entry[3])
+                bounds = [str(bound) for bound in self.buckets] + ["inf"]
+                instructions[name]["latency_ms"] = {
+                    "count": count,
+                    "mean": total / count,
+                    "max": maximum,
+                    "histogram": dict(zip(bounds, histogram)),
+                }
+
+        return {
+            "uptime": time.monotonic() - self.start_time,
+            "tx_bytes": self.tx_bytes,
+            "rx_bytes": self.rx_bytes,
+            "instructions": instructions,
+            "results": results(self.results),
+            "servos": {sts_id: results(counts) for sts_id, counts in sorted(dict(self.servos).items())},
+        }
@@ -0,0 +1,75 @@
+import mmap
+import os
+import struct
+import time
+
+from .values import *
+
+
+# File: CAPTURE_MAGIC, then records: timestamp (time.monotonic_ns), direction (CAPTURE_TX/CAPTURE_RX),
+# payload length, payload
+CAPTURE_MAGIC = b"STSCAP\x01\x00"
+CAPTURE_RECORD = struct.Struct("<QBH")
+
+
+class CaptureWriter(object):
+    """
+    Append-only capture file. Each record is written with a single write call,
+    so records from several threads never interleave.
+    """
+
+    def __init__(self, path):
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+                    raise ValueError(f"Not a capture file: {path}")
+            self.file = open(path, "ab")
+        else:
+            self.file = open(path, "ab")
+            self.file.write(CAPTURE_MAGIC)
+
+    def write(self, direction, data):
+        self.file.write(CAPTURE_RECORD.pack(time.monotonic_ns(), direction, len(data)) + bytes(data))
+
+    def close(self):
+        self.file.close()
+
+
+class CaptureReader(object):
+    """
+    Memory-mapped capture file. A truncated last record (capture interrupted) is ignored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        if os.fstat(self.file.fileno()).st_size > 0:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.data = b""
+
+        if self.data[0: len(CAPTURE_MAGIC)] != CAPTURE_MAGIC:
+            self.close()
+            raise ValueError(f"Not a capture file: {path}")
+
+    def records(self, direction = None):
+        """
+        :param direction: CAPTURE_TX or CAPTURE_RX only (facultative, both by default)
+
+        :return: generator of (timestamp in ns, direction, payload)
+        """
+        offset = len(CAPTURE_MAGIC)
+        size = len(self.data)
+        while offset + CAPTURE_RECORD.size <= size:
+            timestamp, record_direction, length = CAPTURE_RECORD.unpack_from(self.data, offset)
+            offset += CAPTURE_RECORD.size
+            if offset + length > size:
+                return
+            if direction is None or direction == record_direction:
+                yield timestamp, record_direction, self.data[offset: offset + length]
+            offset += length
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
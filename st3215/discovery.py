@@ -0,0 +1,135 @@
+import datetime
+import json
+import os
+
+from .values import *
+
+
+class BusDiscovery(object):
+    """
+    Servo discovery with sync reads of the model number.
+
+    The ID range is split into groups of DISCOVERY_RANGE IDs, each one probed by a single sync read:
+    present servos answer in turn, missing ones cost nothing but the end of the timeout.
+    The timeout is the transmission time of the status packets plus the status packet latency
+    learned by the port (TimeoutEstimator), at most DISCOVERY_TIMEOUT.
+    When a group gets a corrupt status packet (e.g. two servos with the same ID), the IDs that did not
+    answer cleanly are split in two halves and probed again, down to single IDs which are reported as collisions.
+    """
+
+    def __init__(self, ph, range_size = DISCOVERY_RANGE, max_latency = DISCOVERY_TIMEOUT):
+        self.ph = ph
+        self.range_size = range_size
+        self.max_latency = max_latency
+
+    def timeout(self, count):
+        port_handler = self.ph.portHandler
+        # HEADER0 HEADER1 ID LENGTH ERROR MODEL_L MODEL_H CHECKSUM per servo
+        latency = min(port_handler.timeout_estimator.timeout(None), self.max_latency)
+        return port_handler.tx_time_per_byte * (8 * count + 3) + latency
+
+    def syncRead(self, ids):
+        """
+        :return: communication result and dict {servo ID: [Error, MODEL_L, MODEL_H]} of the servos that answered
+        """
+        result = self.ph.syncReadTx(STS_MODEL_L, 2, ids, len(ids))
+        if result != COMM_SUCCESS:
+            return result, {}
+
+        result, rxpackets = self.ph.syncReadRx(2, len(ids), self.timeout(len(ids)))
+        return result, {rxpacket[PKT_ID]: rxpacket[PKT_ERROR: PKT_PARAMETER0 + 2]
+                        for rxpacket in rxpackets if rxpacket[PKT_LENGTH] == 4}
+
+    def probe(self, ids):
+        """
+        Probe a list of IDs.
+
+        :param ids: list of servo ID
+
+        :return: dict {servo ID: model number} and list of the IDs with colliding status packets
+        """
+        steps = self.steps(ids)
+        try:
+            group = next(steps)
+            while True:
+                group = steps.send(self.syncRead(group))
+        except StopIteration as stop:
+            return stop.value
+
+    def steps(self, ids):
+        """
+        Probe of a list of IDs, without I/O: yields the groups of IDs to sync read and receives
+        the result of each sync read (see syncRead), so that AsyncST3215 awaits its own sync reads.
+
+        :param ids: list of servo ID
+
+        :return: dict {servo ID: model number} and list of the IDs with colliding status packets
+        """
+        found = {}
+        collisions = []
+
+        ids = list(ids)
+        groups = [ids[i: i + self.range_size] for i in range(0, len(ids), self.range_size)]
+        retried = set()
+        while groups:
+            group = groups.pop()
+            result, data = yield group
+
+            for sts_id, (error, model_l, model_h) in data.items():
+                if sts_id in group and error == 0:
+                    found[sts_id] = self.ph.sts_makeword(model_l, model_h)
+
+            if result != COMM_RX_CORRUPT:
+                continue
+
+            remaining = [sts_id for sts_id in group if sts_id not in found]
+            if len(remaining) > 1:
+                half = len(remaining) // 2
+                groups.append(remaining[half:])
+                groups.append(remaining[:half])
+            elif remaining and remaining[0] not in retried:
+                # a single corrupt status packet may be noise
+                retried.add(remaining[0])
+                groups.append(remaining)
+            elif remaining:
+                collisions.append(remaining[0])
+
+        return found, sorted(collisions)
+
+    @staticmethod
+    def loadRoster(path, port_name):
+        """
+        :return: list of the servo ID last found on the port, None when unknown
+        """
+        try:
+            with open(os.path.expanduser(path)) as f:
+                roster = json.load(f).get(port_name)
+        except (OSError, ValueError):
+            return None
+
+        if not roster:
+            return None
+        return roster["ids"]
+
+    @staticmethod
+    def saveRoster(path, port_name, servos):
+        """
+        :param servos: dict {servo ID: model number}
+        """
+        path = os.path.expanduser(path)
+        try:
+            with open(path) as f:
+                rosters = json.load(f)
+        except (OSError, ValueError):
+            rosters = {}
+
+        rosters[port_name] = {
+            "ids": sorted(servos),
+            "models": {str(sts_id): model for sts_id, model in sorted(servos.items())},
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        }
+        try:
+            with open(path, "w") as f:
+                json.dump(rosters, f, indent=2)
+        except OSError:
+            pass
@@ -55,22 +55,24 @@ class GroupSyncRead:
     def rxPacket(self):
         self.last_result = True
 
-        result = COMM_RX_FAIL
-
         if len(self.data_dict.keys()) == 0:
             return COMM_NOT_AVAILABLE
 
-        result, rxpacket = self.ph.syncReadRx(self.data_length, len(self.data_dict.keys()))
-        # print(rxpacket)
-        if len(rxpacket) >= (self.data_length+6):
-            for sts_id in self.data_dict:
-                self.data_dict[sts_id], result = self.readRx(rxpacket, sts_id, self.data_length)
-                if result != COMM_SUCCESS:
-                    self.last_result = False
-                # print(sts_id)
-        else:
-            self.last_result = False
-        # print(self.last_result)
+        result, rxpackets = self.ph.syncReadRx(self.data_length, len(self.data_dict.keys()))
+
+        for sts_id in self.data_dict:
+            self.data_dict[sts_id] = []
+
+        for rxpacket in rxpackets:
+            sts_id = rxpacket[PKT_ID]
+            if sts_id in self.data_dict and rxpacket[PKT_LENGTH] == (self.data_length + 2):
+                # [Error, data...]
+                self.data_dict[sts_id] = rxpacket[PKT_ERROR: PKT_PARAMETER0 + self.data_length]
+
+        for sts_id in self.data_dict:
+            if not self.data_dict[sts_id]:
+                self.last_result = False
+
         return result
 
     def txRxPacket(self):
@@ -80,47 +82,6 @@ class GroupSyncRead:
 
         return self.rxPacket()
 
-    def readRx(self, rxpacket, sts_id, data_length):
-        # print(sts_id)
-        # print(rxpacket)
-        data = []
-        rx_length = len(rxpacket)
-        # print(rx_length)
-        rx_index = 0;
-        while (rx_index+6+data_length) <= rx_length:
-            headpacket = [0x00, 0x00, 0x00]
-            while rx_index < rx_length:
-                headpacket[2] = headpacket[1];
-                headpacket[1] = headpacket[0];
-                headpacket[0] = rxpacket[rx_index];
-                rx_index += 1
-                if (headpacket[2] == 0xFF) and (headpacket[1] == 0xFF) and headpacket[0] == sts_id:
-                    # print(rx_index)
-                    break
-            # print(rx_index+3+data_length)
-            if (rx_index+3+data_length) > rx_length:
-                break;
-            if rxpacket[rx_index] != (data_length+2):
-                rx_index += 1
-                # print(rx_index)
-                continue
-            rx_index += 1
-            Error = rxpacket[rx_index]
-            rx_index += 1
-            calSum = sts_id + (data_length+2) + Error
-            data = [Error]
-            data.extend(rxpacket[rx_index : rx_index+data_length])
-            for i in range(0, data_length):
-                calSum += rxpacket[rx_index]
-                rx_index += 1
-            calSum = ~calSum & 0xFF
-            # print(calSum)
-            if calSum != rxpacket[rx_index]:
-                return None, COMM_RX_CORRUPT
-            return data, COMM_SUCCESS 
-        # print(rx_index)
-        return None, COMM_RX_CORRUPT
-
     def isAvailable(self, sts_id, address, data_length):
         #if self.last_result is False or sts_id not in self.data_dict:
         if sts_id not in self.data_dict:
@@ -138,12 +99,12 @@ class GroupSyncRead:
         if data_length == 1:
             return self.data_dict[sts_id][address-self.start_address+1]
         elif data_length == 2:
-            return self.ph.scs_makeword(self.data_dict[sts_id][address-self.start_address+1],
+            return self.ph.sts_makeword(self.data_dict[sts_id][address-self.start_address+1],
                                 self.data_dict[sts_id][address-self.start_address+2])
         elif data_length == 4:
-            return self.ph.scs_makedword(self.ph.scs_makeword(self.data_dict[sts_id][address-self.start_address+1],
+            return self.ph.sts_makedword(self.ph.sts_makeword(self.data_dict[sts_id][address-self.start_address+1],
                                               self.data_dict[sts_id][address-self.start_address+2]),
-                                 self.ph.scs_makeword(self.data_dict[sts_id][address-self.start_address+3],
+                                 self.ph.sts_makeword(self.data_dict[sts_id][address-self.start_address+3],
                                               self.data_dict[sts_id][address-self.start_address+4]))
         else:
             return 0
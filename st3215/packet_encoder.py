@@ -0,0 +1,139 @@
+from .values import *
+
+
+class PacketEncoder(object):
+    """
+    Instruction packet encoder.
+
+    Every instruction type has its own preallocated bytearray with the header already set,
+    so encoding a packet only writes the ID, the parameters and the checksum in place.
+    The returned memoryview is ready to be written on the port and stays valid
+    until the next packet of the same type is encoded.
+    """
+
+    def __init__(self):
+        self.ping_packet = self.makeBuffer(6, 2)
+        self.read_packet = self.makeBuffer(8, 4, INST_READ)
+        self.write_packet = self.makeBuffer(TXPACKET_MAX_LEN)
+        self.sync_packet = self.makeBuffer(TXPACKET_MAX_LEN)
+
+        self.ping_view = memoryview(self.ping_packet)
+        self.read_view = memoryview(self.read_packet)
+        self.write_view = memoryview(self.write_packet)
+        self.sync_view = memoryview(self.sync_packet)
+
+    @staticmethod
+    def makeBuffer(size, length = 0, instruction = 0):
+        buffer = bytearray(size)
+        buffer[PKT_HEADER_0] = 0xFF
+        buffer[PKT_HEADER_1] = 0xFF
+        buffer[PKT_LENGTH] = length
+        buffer[PKT_INSTRUCTION] = instruction
+        return buffer
+
+    @staticmethod
+    def checksum(view, total_packet_length):
+        # except header, checksum
+        return ~sum(view[PKT_ID:total_packet_length - 1]) & 0xFF
+
+    def ping(self, sts_id, instruction = INST_PING):
+        """
+        Encode a packet without parameter (PING or ACTION).
+
+        :param sts_id: Servo ID
+        :param instruction: INST_PING or INST_ACTION (facultative, INST_PING by default)
+
+        :return: encoded packet
+        """
+        packet = self.ping_packet
+        packet[PKT_ID] = sts_id
+        packet[PKT_INSTRUCTION] = instruction
+        packet[5] = ~(sts_id + 2 + instruction) & 0xFF
+        return self.ping_view
+
+    def read(self, sts_id, address, length):
+        """
+        Encode a READ packet.
+
+        :param sts_id: Servo ID
+        :param address: first register to read
+        :param length: number of bytes to read
+
+        :return: encoded packet
+        """
+        packet = self.read_packet
+        packet[PKT_ID] = sts_id
+        packet[PKT_PARAMETER0] = address
+        packet[PKT_PARAMETER0 + 1] = length
+        packet[7] = ~(sts_id + 4 + INST_READ + address + length) & 0xFF
+        return self.read_view
+
+    def write(self, sts_id, address, length, data, instruction = INST_WRITE):
+        """
+        Encode a WRITE (or REG_WRITE) packet.
+
+        :param sts_id: Servo ID
+        :param address: first register to write
+        :param length: number of bytes to write
+        :param data: bytes to write
+        :param instruction: INST_WRITE or INST_REG_WRITE (facultative, INST_WRITE by default)
+
+        :return: encoded packet. None if the packet is too long or data is shorter than length.
+        """
+        total_packet_length = length + 7
+        if total_packet_length > TXPACKET_MAX_LEN or len(data) < length:
+            return None
+
+        data = data[0: length]
+
+        packet = self.write_packet
+        packet[PKT_ID] = sts_id
+        packet[PKT_LENGTH] = length + 3
+        packet[PKT_INSTRUCTION] = instruction
+        packet[PKT_PARAMETER0] = address
+        packet[PKT_PARAMETER0 + 1: PKT_PARAMETER0 + 1 + length] = data
+        packet[total_packet_length - 1] = ~(sts_id + length + 3 + instruction + address + sum(data)) & 0xFF
+        return self.write_view[:total_packet_length]
+
+    def sync(self, instruction, start_address, data_length, param, param_length):
+        """
+        Encode a broadcasted SYNC_READ or SYNC_WRITE packet.
+
+        :param instruction: INST_SYNC_READ or INST_SYNC_WRITE
+        :param start_address: first register
+        :param data_length: number of bytes per servo
+        :param param: servo IDs (sync read) or servo IDs followed by their data (sync write)
+        :param param_length: length of param
+
+        :return: encoded packet. None if the packet is too long or param is shorter than param_length.
+        """
+        total_packet_length = param_length + 8
+        if total_packet_length > TXPACKET_MAX_LEN or len(param) < param_length:
+            return None
+
+        packet = self.sync_packet
+        packet[PKT_ID] = BROADCAST_ID
+        packet[PKT_LENGTH] = param_length + 4
+        packet[PKT_INSTRUCTION] = instruction
+        packet[PKT_PARAMETER0] = start_address
+        packet[PKT_PARAMETER0 + 1] = data_length
+        packet[PKT_PARAMETER0 + 2: PKT_PARAMETER0 + 2 + param_length] = param[0: param_length]
+        packet[total_packet_length - 1] = self.checksum(self.sync_view, total_packet_length)
+        return self.sync_view[:total_packet_length]
+
+    def packet(self, txpacket):
+        """
+        Encode a packet given as a list (HEADER0 HEADER1 ID LENGTH INSTRUCTION ... CHKSUM).
+
+        :param txpacket: packet list, header and checksum are filled in
+
+        :return: encoded packet. None if the packet is too long or shorter than its LENGTH.
+        """
+        total_packet_length = txpacket[PKT_LENGTH] + 4  # 4: HEADER0 HEADER1 ID LENGTH
+        if total_packet_length > TXPACKET_MAX_LEN or len(txpacket) < total_packet_length - 1:
+            return None
+
+        packet = self.write_packet
+        packet[PKT_ID: total_packet_length - 1] = txpacket[PKT_ID: total_packet_length - 1]
+        packet[total_packet_length - 1] = self.checksum(self.write_view, total_packet_length)
+        return self.write_view[:total_packet_length]
@@ -0,0 +1,154 @@
+from .values import *
+
+
+# Parser states
+PARSER_HEADER = 0  # looking for 0xFF 0xFF
+PARSER_ID = 1      # header found, waiting for the ID
+PARSER_LENGTH = 2  # ID accepted, waiting for LENGTH and ERROR
+PARSER_BODY = 3    # LENGTH accepted, waiting for the rest of the packet
+
+
+class PacketParser(object):
+    """
+    Incremental status packet parser.
+
+    Received bytes are stored in a fixed ring buffer and consumed by a state machine.
+    The state survives between calls, so a packet can be fed in any number of chunks,
+    bytes are never scanned twice while looking for a header, and the bytes following
+    a complete packet are kept for the next call.
+    """
+
+    def __init__(self, size = RXBUFFER_LEN):
+        self.buffer = bytearray(size)
+        self.size = size
+        self.head = 0
+        self.count = 0
+        self.state = PARSER_HEADER
+        self.packet_length = 0
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+        self.state = PARSER_HEADER
+        self.packet_length = 0
+
+    def isEmpty(self):
+        return self.count == 0
+
+    def hasHeader(self):
+        # the header of the current packet is received (a packet is being assembled)
+        return self.state != PARSER_HEADER
+
+    def free(self):
+        return self.size - self.count
+
+    def need(self):
+        """
+        Number of bytes still missing to complete the current packet.
+        Reading exactly this amount never swallows the beginning of the next packet.
+        """
+        if self.state == PARSER_BODY:
+            expected = self.packet_length
+        else:
+            expected = 6  # minimum length (HEADER0 HEADER1 ID LENGTH ERROR CHKSUM)
+
+        return max(expected - self.count, 1)
+
+    def feed(self, data):
+        """
+        Append received bytes to the ring buffer.
+
+        :param data: received bytes
+
+        :return: number of bytes stored (limited by the free space)
+        """
+        length = min(len(data), self.size - self.count)
+        tail = (self.head + self.count) % self.size
+        first = min(length, self.size - tail)
+
+        self.buffer[tail: tail + first] = data[0: first]
+        if length > first:
+            self.buffer[0: length - first] = data[first: length]
+
+        self.count += length
+        return length
+
+    def peek(self, offset):
+        return self.buffer[(self.head + offset) % self.size]
+
+    def drop(self, length):
+        self.head = (self.head + length) % self.size
+        self.count -= length
+
+    def take(self, length):
+        end = self.head + length
+        if end <= self.size:
+            packet = bytes(self.buffer[self.head: end])
+        else:
+            packet = bytes(self.buffer[self.head:]) + bytes(self.buffer[0: end - self.size])
+        self.drop(length)
+        return packet
+
+    def nextPacket(self):
+        """
+        Run the state machine over the buffered bytes.
+
+        :return: (packet, COMM_SUCCESS) for a valid packet, (packet, COMM_RX_CORRUPT) for a
+                 packet with a wrong checksum, (None, COMM_RX_WAITING) when more bytes are needed.
+        """
+        while True:
+            if self.state == PARSER_HEADER:
+                while self.count >= 2:
+                    if self.peek(PKT_HEADER_0) == 0xFF and self.peek(PKT_HEADER_1) == 0xFF:
+                        self.state = PARSER_ID
+                        break
+                    self.drop(1)
+                else:
+                    return None, COMM_RX_WAITING
+
+            if self.state == PARSER_ID:
+                if self.count <= PKT_ID:
+                    return None, COMM_RX_WAITING
+
+                sts_id = self.peek(PKT_ID)
+                if sts_id == 0xFF:
+                    # 0xFF 0xFF 0xFF: the header starts one byte later
+                    self.drop(1)
+                    continue
+                if sts_id > 0xFD:
+                    # unavailable ID
+                    self.drop(1)
+                    self.state = PARSER_HEADER
+                    continue
+
+                self.state = PARSER_LENGTH
+
+            if self.state == PARSER_LENGTH:
+                if self.count <= PKT_ERROR:
+                    return None, COMM_RX_WAITING
+
+                length = self.peek(PKT_LENGTH)
+                if length < 2 or length > RXPACKET_MAX_LEN or self.peek(PKT_ERROR) > 0x7F:
+                    # unavailable Length or unavailable Error
+                    self.drop(1)
+                    self.state = PARSER_HEADER
+                    continue
+
+                self.packet_length = length + PKT_LENGTH + 1
+                self.state = PARSER_BODY
+
+            if self.count < self.packet_length:
+                return None, COMM_RX_WAITING
+
+            packet = self.take(self.packet_length)
+            self.state = PARSER_HEADER
+
+            # verify checksum (except header, checksum)
+            if packet[-1] == ~sum(packet[PKT_ID: -1]) & 0xFF:
+                return packet, COMM_SUCCESS
+
+            # the header may be noise, or the packet cut by a lost byte: the bytes following
+            # the header are put back, so the next packet is searched from the next byte
+            self.head = (self.head - self.packet_length + 1) % self.size
+            self.count += self.packet_length - 1
+            return packet, COMM_RX_CORRUPT
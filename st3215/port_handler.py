@@ -1,8 +1,19 @@
+import math
+import select
 import time
 import serial
 import sys
 
 from .values import *
+from .timeout_estimator import *
+from .bus_scheduler import *
+from .bus_stats import *
+from .capture import *
+
+
+# sim:// and replay:// URLs (see protocol_sim and protocol_replay)
+if __package__ not in serial.protocol_handler_packages:
+    serial.protocol_handler_packages.append(__package__)
 
 
 class PortHandler(object):
@@ -13,10 +24,34 @@ class PortHandler(object):
         self.packet_timeout = 0.0
         self.tx_time_per_byte = 0.0
 
-        self.is_using = False
+        # reply timeout learned per servo (see setPacketTimeout)
+        self.adaptive_timeout = True
+        self.timeout_estimator = TimeoutEstimator()
+        self.packet_sts_id = None
+        self.packet_length = 0
+        self.packet_extended = False
+
+        self.scheduler = BusScheduler()
+        self.generation = 0  # incremented each time the port is (re)opened
+        self.stats = BusStats()
+        self.capture = None
         self.port_name = port_name
         self.ser = None
 
+        # wait for the status packet without using the CPU (see readPortWait)
+        self.blocking = True
+        self.poller = None
+
+    @property
+    def is_using(self):
+        return self.scheduler.isBusy()
+
+    def acquireBus(self, priority = PRIORITY_CONTROL):
+        return self.scheduler.acquire(priority)
+
+    def releaseBus(self):
+        self.scheduler.release()
+
     def openPort(self):
         return self.setupPort()
 
@@ -27,6 +62,10 @@ class PortHandler(object):
     def clearPort(self):
         self.ser.flush()
 
+    def clearInput(self):
+        # discard the received bytes nobody waits for (status packets of unacknowledged writes)
+        self.ser.reset_input_buffer()
+
     def setPortName(self, port_name):
         self.port_name = port_name
 
@@ -36,25 +75,131 @@ class PortHandler(object):
     def getBaudRate(self):
         return self.baudrate
 
+    def setBaudRate(self, baudrate):
+        """
+        Change the baud rate of the open port, without reopening it.
+
+        :param baudrate: one of the servo baud rates (STS_BAUDRATES)
+
+        :return: False if the baud rate is not supported by the servos
+        """
+        if baudrate not in BAUDRATE_CODES:
+            return False
+
+        self.baudrate = baudrate
+        if self.is_open:
+            self.ser.flush()
+            self.ser.baudrate = baudrate
+            self.ser.reset_input_buffer()
+
+        self.tx_time_per_byte = (1000.0 / self.baudrate) * 10.0
+        # the latencies learned include the transmission time of the status packets
+        self.timeout_estimator.reset()
+        return True
+
     def getBytesAvailable(self):
         return self.ser.in_waiting
 
     def readPort(self, length):
         if (sys.version_info > (3, 0)):
-            return self.ser.read(length)
+            data = self.ser.read(length)
         else:
-            return [ord(ch) for ch in self.ser.read(length)]
+            data = [ord(ch) for ch in self.ser.read(length)]
+
+        self.stats.rx_bytes += len(data)
+        if self.capture is not None and data:
+            self.capture.write(CAPTURE_RX, data)
+        return data
+
+    def readPortWait(self, length):
+        """
+        Read up to length bytes. In blocking mode, sleep until some bytes are received
+        or the packet timeout expires, instead of returning immediately.
+        """
+        if not self.blocking:
+            return self.readPort(length)
+
+        remaining = self.packet_timeout - self.getTimeSinceStart()
+        if remaining <= 0:
+            return self.readPort(length)
+
+        if self.poller is not None:
+            self.poller.poll(math.ceil(remaining))
+            return self.readPort(length)
+
+        # no pollable file descriptor (Windows): blocking read bounded by the remaining time
+        self.ser.timeout = remaining / 1000.0
+        try:
+            return self.readPort(length)
+        finally:
+            self.ser.timeout = 0
 
     def writePort(self, packet):
-        return self.ser.write(packet)
-
-    def setPacketTimeout(self, packet_length):
+        if self.capture is not None:
+            self.capture.write(CAPTURE_TX, packet)
+        written = self.ser.write(packet)
+        self.stats.packetSent(packet, written)
+        return written
+
+    def startCapture(self, path):
+        """
+        Record the traffic in a capture file (see CaptureReader), appended if it exists.
+        The capture can be replayed with the URL replay://path.
+
+        :param path: capture file
+        """
+        self.stopCapture()
+        self.capture = CaptureWriter(path)
+
+    def stopCapture(self):
+        if self.capture is not None:
+            self.capture.close()
+            self.capture = None
+
+    def setPacketTimeout(self, packet_length, sts_id = None):
         self.packet_start_time = self.getCurrentTime()
-        self.packet_timeout = (self.tx_time_per_byte * packet_length) + (self.tx_time_per_byte * 3.0) + LATENCY_TIMER
+        self.packet_sts_id = sts_id
+        self.packet_length = packet_length
+        self.packet_extended = False
+
+        if self.adaptive_timeout and sts_id is not None:
+            latency = self.timeout_estimator.timeout(sts_id, self.tx_time_per_byte * packet_length)
+        else:
+            latency = LATENCY_TIMER
+
+        self.packet_timeout = (self.tx_time_per_byte * packet_length) + (self.tx_time_per_byte * 3.0) + latency
+
+    def packetReceived(self):
+        # feed the status packet latency to the timeout estimator
+        if self.packet_sts_id is not None:
+            latency = self.getTimeSinceStart() - (self.tx_time_per_byte * self.packet_length)
+            self.timeout_estimator.update(self.packet_sts_id, latency)
+
+    def packetLost(self):
+        if self.packet_sts_id is not None:
+            self.timeout_estimator.miss(self.packet_sts_id)
 
     def setPacketTimeoutMillis(self, msec):
         self.packet_start_time = self.getCurrentTime()
         self.packet_timeout = msec
+        self.packet_extended = False
+
+    def extendPacketTimeout(self, remaining_length):
+        """
+        Give an expired packet whose header is already received the time to complete,
+        instead of dropping it as corrupt. Only once per packet timeout.
+
+        :param remaining_length: number of bytes still missing
+
+        :return: False if the packet timeout was already extended
+        """
+        if self.packet_extended:
+            return False
+
+        self.packet_extended = True
+        self.packet_timeout = (self.getTimeSinceStart() + (self.tx_time_per_byte * remaining_length)
+                               + ADAPTIVE_TIMEOUT_MARGIN)
+        return True
 
     def isPacketTimeout(self):
         if self.getTimeSinceStart() > self.packet_timeout:
@@ -64,7 +209,8 @@ class PortHandler(object):
         return False
 
     def getCurrentTime(self):
-        return round(time.time() * 1000000000) / 1000000.0
+        # monotonic, in ms
+        return time.monotonic_ns() / 1000000.0
 
     def getTimeSinceStart(self):
         time_since = self.getCurrentTime() - self.packet_start_time
@@ -77,8 +223,8 @@ class PortHandler(object):
         if self.is_open:
             self.closePort()
 
-        self.ser = serial.Serial(
-            port=self.port_name,
+        self.ser = serial.serial_for_url(
+            self.port_name,
             baudrate=self.baudrate,
             bytesize=serial.EIGHTBITS,
             timeout=0
@@ -88,7 +234,19 @@ class PortHandler(object):
 
         self.ser.reset_input_buffer()
 
+        self.poller = None
+        if hasattr(select, "poll"):
+            try:
+                fd = self.ser.fileno()
+            except (AttributeError, OSError, ValueError):
+                fd = None
+            if fd is not None:
+                self.poller = select.poll()
+                self.poller.register(fd, select.POLLIN)
+
         self.tx_time_per_byte = (1000.0 / self.baudrate) * 10.0
+        self.timeout_estimator.reset()
+        self.generation += 1
 
         return True
 
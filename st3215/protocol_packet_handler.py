@@ -1,10 +1,26 @@
+import threading
+
 from .values import *
+from .packet_encoder import *
+from .packet_parser import *
 
 class protocol_packet_handler(object):
     def __init__(self, portHandler):
         #self.sts_setend(protocol_end)# STServo bit end(STS/SMS=0, SCS=1)
         self.portHandler = portHandler
         self.sts_end = 0
+        self.local = threading.local()
+        self.parser = PacketParser()
+        self.sync_read_ids = set()
+
+    @property
+    def encoder(self):
+        # one encoder per thread: encoded packets are views on the encoder buffers
+        try:
+            return self.local.encoder
+        except AttributeError:
+            self.local.encoder = PacketEncoder()
+            return self.local.encoder
 
     def sts_getend(self):
         return self.sts_end
@@ -51,6 +67,19 @@ class protocol_packet_handler(object):
         else:
             return w & 0xFF
         
+    def stats(self, reset = False):
+        """
+        Bus counters (see BusStats.snapshot).
+
+        :param reset: reset the counters after the snapshot (facultative, False by default)
+
+        :return: dict of the counters
+        """
+        snapshot = self.portHandler.stats.snapshot()
+        if reset:
+            self.portHandler.stats.reset()
+        return snapshot
+
     def getProtocolVersion(self):
         return 1.0
 
@@ -95,108 +124,68 @@ class protocol_packet_handler(object):
         return ""
 
     def txPacket(self, txpacket):
-        checksum = 0
-        total_packet_length = txpacket[PKT_LENGTH] + 4  # 4: HEADER0 HEADER1 ID LENGTH
+        # txpacket is either a packet list (header and checksum are added here)
+        # or a packet already encoded by self.encoder (None when too long)
+        if isinstance(txpacket, list):
+            txpacket = self.encoder.packet(txpacket)
+
+        # wait for the bus (COMM_PORT_BUSY when the request is dropped by the scheduler)
+        if txpacket is not None and txpacket[PKT_INSTRUCTION] in (INST_PING, INST_READ, INST_SYNC_READ):
+            priority = PRIORITY_TELEMETRY
+        else:
+            priority = PRIORITY_CONTROL
 
-        if self.portHandler.is_using:
+        if not self.portHandler.acquireBus(priority):
+            if txpacket is not None:
+                self.portHandler.stats.transaction(txpacket[PKT_INSTRUCTION], txpacket[PKT_ID], COMM_PORT_BUSY)
             return COMM_PORT_BUSY
-        self.portHandler.is_using = True
 
         # check max packet length
-        if total_packet_length > TXPACKET_MAX_LEN:
-            self.portHandler.is_using = False
+        if txpacket is None:
+            self.portHandler.releaseBus()
+            self.portHandler.stats.transaction(None, BROADCAST_ID, COMM_TX_ERROR)
             return COMM_TX_ERROR
 
-        # make packet header
-        txpacket[PKT_HEADER_0] = 0xFF
-        txpacket[PKT_HEADER_1] = 0xFF
-
-        # add a checksum to the packet
-        for idx in range(2, total_packet_length - 1):  # except header, checksum
-            checksum += txpacket[idx]
-
-        txpacket[total_packet_length - 1] = ~checksum & 0xFF
+        total_packet_length = len(txpacket)
 
         #print "[TxPacket] %r" % txpacket
 
-        # tx packet
+        # tx packet, the bytes received before it are stale
         self.portHandler.clearPort()
+        self.portHandler.clearInput()
+        self.parser.clear()
         written_packet_length = self.portHandler.writePort(txpacket)
         if total_packet_length != written_packet_length:
-            self.portHandler.is_using = False
+            self.portHandler.releaseBus()
+            self.portHandler.stats.transaction(txpacket[PKT_INSTRUCTION], txpacket[PKT_ID], COMM_TX_FAIL)
             return COMM_TX_FAIL
 
         return COMM_SUCCESS
 
     def rxPacket(self):
-        rxpacket = []
-
-        result = COMM_TX_FAIL
-        checksum = 0
-        rx_length = 0
-        wait_length = 6  # minimum length (HEADER0 HEADER1 ID LENGTH ERROR CHKSUM)
+        rxpacket, result = self.receivePacket()
 
-        while True:
-            rxpacket.extend(self.portHandler.readPort(wait_length - rx_length))
-            rx_length = len(rxpacket)
-            if rx_length >= wait_length:
-                # find packet header
-                for idx in range(0, (rx_length - 1)):
-                    if (rxpacket[idx] == 0xFF) and (rxpacket[idx + 1] == 0xFF):
-                        break
-
-                if idx == 0:  # found at the beginning of the packet
-                    if (rxpacket[PKT_ID] > 0xFD) or (rxpacket[PKT_LENGTH] > RXPACKET_MAX_LEN) or (
-                            rxpacket[PKT_ERROR] > 0x7F):
-                        # unavailable ID or unavailable Length or unavailable Error
-                        # remove the first byte in the packet
-                        del rxpacket[0]
-                        rx_length -= 1
-                        continue
-
-                    # re-calculate the exact length of the rx packet
-                    if wait_length != (rxpacket[PKT_LENGTH] + PKT_LENGTH + 1):
-                        wait_length = rxpacket[PKT_LENGTH] + PKT_LENGTH + 1
-                        continue
-
-                    if rx_length < wait_length:
-                        # check timeout
-                        if self.portHandler.isPacketTimeout():
-                            if rx_length == 0:
-                                result = COMM_RX_TIMEOUT
-                            else:
-                                result = COMM_RX_CORRUPT
-                            break
-                        else:
-                            continue
-
-                    # calculate checksum
-                    for i in range(2, wait_length - 1):  # except header, checksum
-                        checksum += rxpacket[i]
-                    checksum = ~checksum & 0xFF
-
-                    # verify checksum
-                    if rxpacket[wait_length - 1] == checksum:
-                        result = COMM_SUCCESS
-                    else:
-                        result = COMM_RX_CORRUPT
-                    break
+        self.portHandler.releaseBus()
+        return rxpacket, result
 
+    def receivePacket(self):
+        # same as rxPacket, without releasing the bus
+        # packets are assembled by self.parser, bytes following a packet are kept for the next call
+        rxpacket, result = self.parser.nextPacket()
+        while result == COMM_RX_WAITING:
+            self.parser.feed(self.portHandler.readPortWait(self.parser.need()))
+            rxpacket, result = self.parser.nextPacket()
+
+            # check timeout, once extended for a packet whose header is already received
+            if (result == COMM_RX_WAITING and self.portHandler.isPacketTimeout()
+                    and not (self.parser.hasHeader() and self.portHandler.extendPacketTimeout(self.parser.need()))):
+                if self.parser.isEmpty():
+                    result = COMM_RX_TIMEOUT
                 else:
-                    # remove unnecessary packets
-                    del rxpacket[0: idx]
-                    rx_length -= idx
+                    result = COMM_RX_CORRUPT
+                self.parser.clear()
+                rxpacket = []
 
-            else:
-                # check timeout
-                if self.portHandler.isPacketTimeout():
-                    if rx_length == 0:
-                        result = COMM_RX_TIMEOUT
-                    else:
-                        result = COMM_RX_CORRUPT
-                    break
-
-        self.portHandler.is_using = False
         return rxpacket, result
 
     def txRxPacket(self, txpacket):
@@ -210,38 +199,46 @@ class protocol_packet_handler(object):
 
         # (ID == Broadcast ID) == no need to wait for status packet or not available
         if (txpacket[PKT_ID] == BROADCAST_ID):
-            self.portHandler.is_using = False
+            self.portHandler.releaseBus()
+            self.portHandler.stats.transaction(txpacket[PKT_INSTRUCTION], BROADCAST_ID, result)
             return rxpacket, result, error
 
         # set packet timeout
+        sts_id = txpacket[PKT_ID]
         if txpacket[PKT_INSTRUCTION] == INST_READ:
-            self.portHandler.setPacketTimeout(txpacket[PKT_PARAMETER0 + 1] + 6)
+            rx_length = txpacket[PKT_PARAMETER0 + 1] + 2
         else:
-            self.portHandler.setPacketTimeout(6)  # HEADER0 HEADER1 ID LENGTH ERROR CHECKSUM
+            rx_length = 2
+        self.portHandler.setPacketTimeout(rx_length + 4, sts_id)  # HEADER0 HEADER1 ID LENGTH ERROR ... CHECKSUM
 
-        # rx packet
+        # rx packet, skipping the status packets of other servos and the late ones of
+        # unacknowledged writes (different LENGTH)
         while True:
-            rxpacket, result = self.rxPacket()
-            if result != COMM_SUCCESS or txpacket[PKT_ID] == rxpacket[PKT_ID]:
+            rxpacket, result = self.receivePacket()
+            if result != COMM_SUCCESS or (sts_id == rxpacket[PKT_ID] and rx_length == rxpacket[PKT_LENGTH]):
                 break
 
-        if result == COMM_SUCCESS and txpacket[PKT_ID] == rxpacket[PKT_ID]:
+        self.portHandler.releaseBus()
+
+        latency = None
+        if result == COMM_SUCCESS and sts_id == rxpacket[PKT_ID]:
             error = rxpacket[PKT_ERROR]
+            latency = self.portHandler.getTimeSinceStart()
+            self.portHandler.packetReceived()
+        elif result == COMM_RX_TIMEOUT:
+            self.portHandler.packetLost()
 
+        self.portHandler.stats.transaction(txpacket[PKT_INSTRUCTION], sts_id, result, latency)
         return rxpacket, result, error
 
     def ping(self, sts_id):
         model_number = 0
         error = 0
 
-        txpacket = [0] * 6
-
         if sts_id >= BROADCAST_ID:
             return model_number, COMM_NOT_AVAILABLE, error
 
-        txpacket[PKT_ID] = sts_id
-        txpacket[PKT_LENGTH] = 2
-        txpacket[PKT_INSTRUCTION] = INST_PING
+        txpacket = self.encoder.ping(sts_id)
 
         rxpacket, result, error = self.txRxPacket(txpacket)
 
@@ -253,11 +250,7 @@ class protocol_packet_handler(object):
         return model_number, result, error
 
     def action(self, sts_id):
-        txpacket = [0] * 6
-
-        txpacket[PKT_ID] = sts_id
-        txpacket[PKT_LENGTH] = 2
-        txpacket[PKT_INSTRUCTION] = INST_ACTION
+        txpacket = self.encoder.ping(sts_id, INST_ACTION)
 
         _, result, _ = self.txRxPacket(txpacket)
 
@@ -265,22 +258,16 @@ class protocol_packet_handler(object):
 
     def readTx(self, sts_id, address, length):
 
-        txpacket = [0] * 8
-
         if sts_id >= BROADCAST_ID:
             return COMM_NOT_AVAILABLE
 
-        txpacket[PKT_ID] = sts_id
-        txpacket[PKT_LENGTH] = 4
-        txpacket[PKT_INSTRUCTION] = INST_READ
-        txpacket[PKT_PARAMETER0 + 0] = address
-        txpacket[PKT_PARAMETER0 + 1] = length
+        txpacket = self.encoder.read(sts_id, address, length)
 
         result = self.txPacket(txpacket)
 
         # set packet timeout
         if result == COMM_SUCCESS:
-            self.portHandler.setPacketTimeout(length + 6)
+            self.portHandler.setPacketTimeout(length + 6, sts_id)
 
         return result
 
@@ -292,30 +279,31 @@ class protocol_packet_handler(object):
         data = []
 
         while True:
-            rxpacket, result = self.rxPacket()
+            rxpacket, result = self.receivePacket()
 
-            if result != COMM_SUCCESS or rxpacket[PKT_ID] == sts_id:
+            if result != COMM_SUCCESS or (rxpacket[PKT_ID] == sts_id and rxpacket[PKT_LENGTH] == length + 2):
                 break
 
+        self.portHandler.releaseBus()
+
+        latency = None
         if result == COMM_SUCCESS and rxpacket[PKT_ID] == sts_id:
             error = rxpacket[PKT_ERROR]
+            latency = self.portHandler.getTimeSinceStart()
+            self.portHandler.packetReceived()
 
             data.extend(rxpacket[PKT_PARAMETER0 : PKT_PARAMETER0+length])
 
+        self.portHandler.stats.transaction(INST_READ, sts_id, result, latency)
         return data, result, error
 
     def readTxRx(self, sts_id, address, length):
-        txpacket = [0] * 8
         data = []
 
         if sts_id >= BROADCAST_ID:
             return data, COMM_NOT_AVAILABLE, 0
 
-        txpacket[PKT_ID] = sts_id
-        txpacket[PKT_LENGTH] = 4
-        txpacket[PKT_INSTRUCTION] = INST_READ
-        txpacket[PKT_PARAMETER0 + 0] = address
-        txpacket[PKT_PARAMETER0 + 1] = length
+        txpacket = self.encoder.read(sts_id, address, length)
 
         rxpacket, result, error = self.txRxPacket(txpacket)
         if result == COMM_SUCCESS:
@@ -325,6 +313,111 @@ class protocol_packet_handler(object):
 
         return data, result, error
 
+    def readTxRxPipelined(self, requests, depth = PIPELINE_DEPTH):
+        """
+        Pipelined reads: up to depth READ instructions are sent back-to-back (at most one per servo and
+        PIPELINE_RX_BYTES of expected status packets at a time), then the status packets are matched
+        to their request by ID. A new request is sent each time a status packet arrives or a request times out.
+        Each request has its own deadline: a missing servo only delays the requests sent after it by its timeout.
+        All the requests are completed before the results are yielded, so the bus is never held by a
+        suspended generator.
+
+        :param requests: list of (servo ID, address, length)
+        :param depth: maximum number of requests waiting for their status packet
+
+        :return: generator of (request index, data, result, error), in arrival order
+        """
+        yield from self.pipelinedReads(requests, depth)
+
+    def pipelinedReads(self, requests, depth):
+        # readTxRxPipelined, returning the list of results
+        results = []
+        pending = []
+        outstanding = {}  # sts_id: [index, length, deadline, sent]
+        rx_bytes = 0
+
+        for index, request in enumerate(requests):
+            if request[0] >= BROADCAST_ID:
+                results.append((index, [], COMM_NOT_AVAILABLE, 0))
+            else:
+                pending.append((index, request))
+
+        if not pending:
+            return results
+
+        if not self.portHandler.acquireBus(PRIORITY_TELEMETRY):
+            results.extend((index, [], COMM_PORT_BUSY, 0) for index, _ in pending)
+            return results
+
+        self.portHandler.clearInput()
+        self.parser.clear()
+        try:
+            while pending or outstanding:
+                # send the next requests
+                for request in list(pending):
+                    if len(outstanding) >= depth:
+                        break
+                    index, (sts_id, address, length) = request
+                    if sts_id in outstanding:
+                        continue
+                    if outstanding and rx_bytes + length + 6 > PIPELINE_RX_BYTES:
+                        break
+
+                    txpacket = self.encoder.read(sts_id, address, length)
+                    pending.remove(request)
+                    if self.portHandler.writePort(txpacket) != len(txpacket):
+                        results.append((index, [], COMM_TX_FAIL, 0))
+                        continue
+
+                    # the status packet comes after the ones already expected: its deadline covers their
+                    # transmission time, but not their latency
+                    rx_bytes += length + 6
+                    sent = self.portHandler.getCurrentTime()
+                    deadline = (sent
+                                + self.portHandler.tx_time_per_byte * (rx_bytes + 3)
+                                + self.portHandler.timeout_estimator.timeout(sts_id, self.portHandler.tx_time_per_byte * (length + 6)))
+                    outstanding[sts_id] = [index, length, deadline, sent]
+
+                if not outstanding:
+                    continue
+
+                rxpacket, result = self.parser.nextPacket()
+                if result == COMM_RX_WAITING:
+                    now = self.portHandler.getCurrentTime()
+                    sts_id = min(outstanding, key=lambda k: outstanding[k][2])
+                    index, length, deadline, _ = outstanding[sts_id]
+                    if now >= deadline:
+                        del outstanding[sts_id]
+                        rx_bytes -= length + 6
+                        self.portHandler.timeout_estimator.miss(sts_id)
+                        self.portHandler.stats.transaction(INST_READ, sts_id, COMM_RX_TIMEOUT)
+                        if not outstanding:
+                            self.parser.clear()
+                        results.append((index, [], COMM_RX_TIMEOUT, 0))
+                        continue
+
+                    self.portHandler.setPacketTimeoutMillis(deadline - now)
+                    self.parser.feed(self.portHandler.readPortWait(self.parser.need()))
+                    continue
+
+                sts_id = rxpacket[PKT_ID]
+                if sts_id not in outstanding or rxpacket[PKT_LENGTH] != outstanding[sts_id][1] + 2:
+                    # late status packet of an expired request or of an unacknowledged write
+                    continue
+
+                index, length, _, sent = outstanding.pop(sts_id)
+                rx_bytes -= length + 6
+                self.portHandler.stats.transaction(INST_READ, sts_id, result,
+                                                   self.portHandler.getCurrentTime() - sent if result == COMM_SUCCESS else None)
+                if result == COMM_SUCCESS:
+                    results.append((index, list(rxpacket[PKT_PARAMETER0: PKT_PARAMETER0 + length]), result, rxpacket[PKT_ERROR]))
+                else:
+                    results.append((index, [], result, 0))
+        finally:
+            self.portHandler.releaseBus()
+
+        return results
+
     def read1ByteTx(self, sts_id, address):
         return self.readTx(sts_id, address, 1)
 
@@ -367,29 +460,16 @@ class protocol_packet_handler(object):
         return data_read, result, error
 
     def writeTxOnly(self, sts_id, address, length, data):
-        txpacket = [0] * (length + 7)
-
-        txpacket[PKT_ID] = sts_id
-        txpacket[PKT_LENGTH] = length + 3
-        txpacket[PKT_INSTRUCTION] = INST_WRITE
-        txpacket[PKT_PARAMETER0] = address
-
-        txpacket[PKT_PARAMETER0 + 1: PKT_PARAMETER0 + 1 + length] = data[0: length]
-
+        txpacket = self.encoder.write(sts_id, address, length, data)
         result = self.txPacket(txpacket)
-        self.portHandler.is_using = False
+        self.portHandler.releaseBus()
 
+        if result == COMM_SUCCESS:
+            self.portHandler.stats.transaction(INST_WRITE, sts_id, result)
         return result
 
     def writeTxRx(self, sts_id, address, length, data):
-        txpacket = [0] * (length + 7)
-
-        txpacket[PKT_ID] = sts_id
-        txpacket[PKT_LENGTH] = length + 3
-        txpacket[PKT_INSTRUCTION] = INST_WRITE
-        txpacket[PKT_PARAMETER0] = address
-
-        txpacket[PKT_PARAMETER0 + 1: PKT_PARAMETER0 + 1 + length] = data[0: length]
+        txpacket = self.encoder.write(sts_id, address, length, data)
         rxpacket, result, error = self.txRxPacket(txpacket)
 
         return result, error
@@ -425,83 +505,78 @@ class protocol_packet_handler(object):
         return self.writeTxRx(sts_id, address, 4, data_write)
 
     def regWriteTxOnly(self, sts_id, address, length, data):
-        txpacket = [0] * (length + 7)
-
-        txpacket[PKT_ID] = sts_id
-        txpacket[PKT_LENGTH] = length + 3
-        txpacket[PKT_INSTRUCTION] = INST_REG_WRITE
-        txpacket[PKT_PARAMETER0] = address
-
-        txpacket[PKT_PARAMETER0 + 1: PKT_PARAMETER0 + 1 + length] = data[0: length]
-
+        txpacket = self.encoder.write(sts_id, address, length, data, INST_REG_WRITE)
         result = self.txPacket(txpacket)
-        self.portHandler.is_using = False
+        self.portHandler.releaseBus()
 
+        if result == COMM_SUCCESS:
+            self.portHandler.stats.transaction(INST_REG_WRITE, sts_id, result)
         return result
 
     def regWriteTxRx(self, sts_id, address, length, data):
-        txpacket = [0] * (length + 7)
-
-        txpacket[PKT_ID] = sts_id
-        txpacket[PKT_LENGTH] = length + 3
-        txpacket[PKT_INSTRUCTION] = INST_REG_WRITE
-        txpacket[PKT_PARAMETER0] = address
-
-        txpacket[PKT_PARAMETER0 + 1: PKT_PARAMETER0 + 1 + length] = data[0: length]
-
+        txpacket = self.encoder.write(sts_id, address, length, data, INST_REG_WRITE)
         _, result, error = self.txRxPacket(txpacket)
 
         return result, error
 
     def syncReadTx(self, start_address, data_length, param, param_length):
-        txpacket = [0] * (param_length + 8)
-        # 8: HEADER0 HEADER1 ID LEN INST START_ADDR DATA_LEN CHKSUM
-
-        txpacket[PKT_ID] = BROADCAST_ID
-        txpacket[PKT_LENGTH] = param_length + 4  # 7: INST START_ADDR DATA_LEN CHKSUM
-        txpacket[PKT_INSTRUCTION] = INST_SYNC_READ
-        txpacket[PKT_PARAMETER0 + 0] = start_address
-        txpacket[PKT_PARAMETER0 + 1] = data_length
-
-        txpacket[PKT_PARAMETER0 + 2: PKT_PARAMETER0 + 2 + param_length] = param[0: param_length]
+        # HEADER0 HEADER1 ID LEN INST START_ADDR DATA_LEN ... CHKSUM
+        txpacket = self.encoder.sync(INST_SYNC_READ, start_address, data_length, param, param_length)
 
         # print(txpacket)
         result = self.txPacket(txpacket)
+        if result == COMM_SUCCESS:
+            # servos expected by syncReadRx (set while holding the bus)
+            self.sync_read_ids = set(param[0: param_length])
         return result
 
-    def syncReadRx(self, data_length, param_length):
-        wait_length = (6 + data_length) * param_length
-        self.portHandler.setPacketTimeout(wait_length)
-        rxpacket = []
-        rx_length = 0
-        while True:
-            rxpacket.extend(self.portHandler.readPort(wait_length - rx_length))
-            rx_length = len(rxpacket)
-            if rx_length >= wait_length:
-                result = COMM_SUCCESS
-                break
-            else:
-                # check timeout
-                if self.portHandler.isPacketTimeout():
-                    if rx_length == 0:
-                        result = COMM_RX_TIMEOUT
-                    else:
+    def syncReadRx(self, data_length, param_length, timeout = None):
+        # returns the list of valid status packets, one per answering servo
+        # timeout in ms (facultative, transmission time of the status packets + LATENCY_TIMER by default)
+        if timeout is None:
+            self.portHandler.setPacketTimeout((6 + data_length) * param_length)
+        else:
+            self.portHandler.setPacketTimeoutMillis(timeout)
+        rxpackets = []
+        received = 0
+        result = COMM_SUCCESS
+        while received < param_length:
+            rxpacket, rx_result = self.parser.nextPacket()
+            if rx_result == COMM_RX_WAITING:
+                # check timeout, once extended for a packet whose header is already received
+                if (self.portHandler.isPacketTimeout()
+                        and not (self.parser.hasHeader() and self.portHandler.extendPacketTimeout(self.parser.need()))):
+                    # missing servos (timeout) or a truncated packet (corrupt)
+                    if not self.parser.isEmpty():
                         result = COMM_RX_CORRUPT
+                    elif result == COMM_SUCCESS:
+                        result = COMM_RX_TIMEOUT
+                    self.parser.clear()
                     break
-        self.portHandler.is_using = False
-        return result, rxpacket
 
-    def syncWriteTxOnly(self, start_address, data_length, param, param_length):
-        txpacket = [0] * (param_length + 8)
-        # 8: HEADER0 HEADER1 ID LEN INST START_ADDR DATA_LEN ... CHKSUM
+                self.parser.feed(self.portHandler.readPortWait(self.parser.need()))
+                continue
+
+            if rx_result != COMM_SUCCESS:
+                # the false header is skipped by the parser, the packet is still expected
+                result = COMM_RX_CORRUPT
+                continue
+            if rxpacket[PKT_ID] not in self.sync_read_ids or rxpacket[PKT_LENGTH] != data_length + 2:
+                # late status packet of an unacknowledged write
+                continue
 
-        txpacket[PKT_ID] = BROADCAST_ID
-        txpacket[PKT_LENGTH] = param_length + 4  # 4: INST START_ADDR DATA_LEN ... CHKSUM
-        txpacket[PKT_INSTRUCTION] = INST_SYNC_WRITE
-        txpacket[PKT_PARAMETER0 + 0] = start_address
-        txpacket[PKT_PARAMETER0 + 1] = data_length
+            received += 1
+            rxpackets.append(rxpacket)
+            self.portHandler.stats.servoResult(rxpacket[PKT_ID], rx_result)
 
-        txpacket[PKT_PARAMETER0 + 2: PKT_PARAMETER0 + 2 + param_length] = param[0: param_length]
+        self.portHandler.releaseBus()
+        self.portHandler.stats.transaction(INST_SYNC_READ, BROADCAST_ID, result,
+                                           self.portHandler.getTimeSinceStart() if result == COMM_SUCCESS else None)
+        return result, rxpackets
+
+    def syncWriteTxOnly(self, start_address, data_length, param, param_length):
+        # HEADER0 HEADER1 ID LEN INST START_ADDR DATA_LEN ... CHKSUM
+        txpacket = self.encoder.sync(INST_SYNC_WRITE, start_address, data_length, param, param_length)
 
         _, result, _ = self.txRxPacket(txpacket)
 
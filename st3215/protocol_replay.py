@@ -0,0 +1,124 @@
+"""
+Replay of a capture file (PortHandler.startCapture), usable as a pyserial URL handler:
+
+    servo = ST3215('replay://session.cap')
+
+URL format: replay://path[?option=value[&option=value...]]
+options:
+- timing: 0 to deliver the recorded replies at once instead of at the recorded timing
+- strict: 1 to raise SerialException when an instruction packet differs from the recorded one
+
+Each instruction packet written on the port consumes the next recorded instruction packet.
+The bytes received after it in the capture (until the next recorded instruction packet)
+are then served with their recorded delay from the instruction packet.
+The number of packets that differ from the capture is Serial.mismatches.
+"""
+
+import time
+
+try:
+    import urlparse
+except ImportError:
+    import urllib.parse as urlparse
+
+from serial.serialutil import SerialException, PortNotOpenError
+
+from .values import *
+from .capture import *
+from . import protocol_sim
+
+
+class Serial(protocol_sim.Serial):
+    """Serial port answering with the status packets of a capture file."""
+
+    def __init__(self, *args, **kwargs):
+        self.reader = None
+        self.records = None
+        self.lookahead = None
+        self.strict = False
+        self.mismatches = 0
+        super(Serial, self).__init__(*args, **kwargs)
+
+    def open(self):
+        if self.is_open:
+            raise SerialException("Port is already open.")
+        if self._port is None:
+            raise SerialException("Port must be configured before it can be used.")
+
+        self.from_url(self.port)
+        self.txbuffer = bytearray()
+        self.rxqueue.clear()
+        self.mismatches = 0
+        self.is_open = True
+
+    def close(self):
+        super(Serial, self).close()
+        if self.reader is not None:
+            self.records = None
+            self.reader.close()
+            self.reader = None
+
+    def from_url(self, url):
+        """open the capture file given by the URL"""
+        parts = urlparse.urlsplit(url)
+        if parts.scheme != "replay":
+            raise SerialException('expected a string in the form "replay://path[?timing=0]": not starting with replay:// ({!r})'.format(parts.scheme))
+
+        try:
+            for option, values in urlparse.parse_qs(parts.query, True).items():
+                if option == 'timing':
+                    self.timing = values[0] not in ('0', 'false', 'no')
+                elif option == 'strict':
+                    self.strict = values[0] not in ('0', 'false', 'no')
+                else:
+                    raise ValueError('unknown option: {!r}'.format(option))
+
+            self.reader = CaptureReader(parts.netloc + parts.path)
+        except (ValueError, OSError) as e:
+            raise SerialException('expected a string in the form "replay://path[?timing=0]": {}'.format(e))
+
+        self.records = self.reader.records()
+        self.lookahead = None
+
+    def nextRecord(self):
+        if self.lookahead is not None:
+            record, self.lookahead = self.lookahead, None
+            return record
+        return next(self.records, None)
+
+    def replay(self, packet, now):
+        # skip to the next recorded instruction packet
+        record = self.nextRecord()
+        while record is not None and record[1] != CAPTURE_TX:
+            record = self.nextRecord()
+        if record is None:
+            return
+
+        sent_time = record[0]
+        if record[2] != packet:
+            self.mismatches += 1
+            if self.strict:
+                raise SerialException(f"instruction packet {packet.hex()} differs from the capture ({record[2].hex()})")
+
+        # the bytes received until the next instruction packet
+        record = self.nextRecord()
+        while record is not None and record[1] == CAPTURE_RX:
+            start = now + (record[0] - sent_time) / 1e9 if self.timing else now
+            self.rxqueue.append([start, 0.0, record[2], 0])
+            record = self.nextRecord()
+        self.lookahead = record
+
+    #  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -
+
+    def write(self, data):
+        if not self.is_open:
+            raise PortNotOpenError()
+
+        with self.condition:
+            self.txbuffer += data
+            for packet in self.instructionPackets():
+                self.tx_end = time.monotonic()
+                self.replay(packet, self.tx_end)
+            self.condition.notify_all()
+
+        return len(data)
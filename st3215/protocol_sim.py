@@ -0,0 +1,474 @@
+"""
+Virtual ST3215 bus, usable as a pyserial URL handler:
+
+    servo = ST3215('sim://?ids=1-8')
+
+URL format: sim://[name][?option=value[&option=value...]]
+options:
+- ids: servo IDs on the bus, comma separated, ranges allowed (1-8,12). Default: 1
+- baud: Bus Speed code of the servos (STS_1M...). The servos do not hear a host using another baud rate.
+- latency: ms between the end of an instruction packet and the status packet (plus STS_RETURN_DELAY)
+- tau: s, time constant of the motion model
+- drop: probability that an instruction packet is lost on the wire
+- corrupt: probability that a status packet is corrupted
+- silent: IDs that execute instructions but never send a status packet
+- seed: seed of the fault generator
+- maxbaud: highest baud rate the wiring supports, every status packet is corrupted above it
+- timing: 0 to deliver the status packets at once instead of at the baud rate
+
+Ports opened with the same URL share the same VirtualBus, so the servos keep their
+state when the port is reopened. The bus of an open port is Serial.bus.
+"""
+
+import collections
+import math
+import random
+import threading
+import time
+
+try:
+    import urlparse
+except ImportError:
+    import urllib.parse as urlparse
+
+from serial.serialutil import SerialBase, SerialException, PortNotOpenError
+
+from .values import *
+
+
+buses = {}  # url: VirtualBus
+
+
+class VirtualServo(object):
+    """
+    Control table and first-order motion model of a servo.
+
+    In position mode the position converges to the goal position with the time constant tau,
+    at most at the goal speed (MAX_SPEED when 0). In wheel mode (STS_MODE 1) the position turns
+    at the signed goal speed.
+    """
+
+    def __init__(self, sts_id, baud = STS_1M, tau = SIM_TAU):
+        self.tau = tau
+        self.time = time.monotonic()
+        self.position = 2048.0
+        self.velocity = 0.0
+        self.registered = None  # (address, data) of the last REG_WRITE
+
+        self.registers = bytearray(256)
+        self.setWord(STS_MODEL_L, SIM_MODEL)
+        self.registers[STS_ID] = sts_id
+        self.registers[STS_BAUD_RATE] = baud
+        self.registers[STS_RESPONSE_LEVEL] = 1
+        self.setWord(STS_MAX_ANGLE_LIMIT_L, MAX_POSITION)
+        self.registers[STS_TORQUE_ENABLE] = 1
+        self.setWord(STS_GOAL_POSITION_L, 2048)
+        self.registers[STS_LOCK] = 1
+        self.registers[STS_PRESENT_VOLTAGE] = SIM_VOLTAGE
+        self.registers[STS_PRESENT_TEMPERATURE] = SIM_TEMPERATURE
+        self.update(self.time)
+
+    @property
+    def sts_id(self):
+        return self.registers[STS_ID]
+
+    @property
+    def baudrate(self):
+        return STS_BAUDRATES.get(self.registers[STS_BAUD_RATE])
+
+    def getWord(self, address):
+        return self.registers[address] | (self.registers[address + 1] << 8)
+
+    def setWord(self, address, value):
+        self.registers[address] = value & 0xFF
+        self.registers[address + 1] = (value >> 8) & 0xFF
+
+    def getSigned(self, address):
+        # sign on bit 15
+        value = self.getWord(address)
+        if value & (1 << 15):
+            return -(value & ~(1 << 15))
+        return value
+
+    def update(self, now):
+        dt = now - self.time
+        if dt < 0:
+            return
+        self.time = now
+
+        goal = self.position
+        if not self.registers[STS_TORQUE_ENABLE]:
+            self.velocity = 0.0
+        elif self.registers[STS_MODE] == 1:
+            self.velocity = float(max(-MAX_SPEED, min(MAX_SPEED, self.getSigned(STS_GOAL_SPEED_L))))
+            self.position = (self.position + self.velocity * dt) % (MAX_POSITION + 1)
+        else:
+            goal = max(self.getWord(STS_MIN_ANGLE_LIMIT_L), min(self.getWord(STS_MAX_ANGLE_LIMIT_L), self.getSigned(STS_GOAL_POSITION_L)))
+            limit = self.getWord(STS_GOAL_SPEED_L) or MAX_SPEED
+            step = (goal - self.position) * (1.0 - math.exp(-dt / self.tau))
+            step = max(-limit * dt, min(limit * dt, step))
+            self.position += step
+            self.velocity = max(-limit, min(limit, (goal - self.position) / self.tau))
+
+        speed = int(round(abs(self.velocity)))
+        self.setWord(STS_PRESENT_POSITION_L, int(round(self.position)))
+        self.setWord(STS_PRESENT_SPEED_L, speed | (1 << 15) if self.velocity < 0 else speed)
+        self.registers[STS_MOVING] = 1 if speed > 0 or abs(goal - self.position) >= 1.0 else 0
+
+    def read(self, address, length, now):
+        self.update(now)
+        return bytes(self.registers[address: address + length]).ljust(length, b'\x00')
+
+    def write(self, address, data, now):
+        self.update(now)
+        for offset, value in enumerate(data):
+            register = address + offset
+            if register > 0xFF:
+                break
+            if register in (STS_MODEL_L, STS_MODEL_H) or STS_PRESENT_POSITION_L <= register <= STS_PRESENT_CURRENT_H:
+                continue  # read only
+            self.registers[register] = value
+
+        if address <= STS_GOAL_POSITION_H and address + len(data) > STS_GOAL_POSITION_L:
+            self.registers[STS_TORQUE_ENABLE] = 1
+
+
+class VirtualBus(object):
+    """
+    Servos sharing a half duplex bus.
+
+    process() executes an instruction packet and returns the status packets, in the order
+    they are sent on the wire.
+    """
+
+    def __init__(self, ids = (1,), baud = STS_1M, latency = SIM_LATENCY, tau = SIM_TAU,
+                 drop = 0.0, corrupt = 0.0, silent = (), seed = None, maxbaud = None):
+        self.servos = [VirtualServo(sts_id, baud, tau) for sts_id in ids]
+        self.max_baudrate = maxbaud
+        self.latency = latency
+        self.drop = drop
+        self.corrupt = corrupt
+        self.silent = set(silent)
+        self.random = random.Random(seed)
+        self.wire_free = 0.0  # end of the last transmission on the wire
+        self.lock = threading.Lock()
+
+    def servo(self, sts_id):
+        for servo in self.servos:
+            if servo.sts_id == sts_id:
+                return servo
+        return None
+
+    def statusPacket(self, servo, params = b''):
+        packet = bytearray([0xFF, 0xFF, servo.sts_id, len(params) + 2, 0])
+        packet += params
+        packet.append(~sum(packet[PKT_ID:]) & 0xFF)
+
+        if self.corrupt and self.random.random() < self.corrupt:
+            index = self.random.randrange(PKT_ID, len(packet))
+            packet[index] ^= self.random.randrange(1, 256)
+
+        return bytes(packet)
+
+    def process(self, packet, now, baudrate):
+        """
+        Execute an instruction packet.
+
+        :param packet: instruction packet (checksum already verified)
+        :param now: time of the end of the instruction packet (time.monotonic())
+        :param baudrate: baud rate of the host
+
+        :return: list of (delay in s, status packet)
+        """
+        if self.drop and self.random.random() < self.drop:
+            return []
+
+        sts_id = packet[PKT_ID]
+        instruction = packet[PKT_INSTRUCTION]
+        params = bytes(packet[PKT_PARAMETER0: -1])
+        listeners = {}  # sts_id: servos hearing the host
+        for servo in self.servos:
+            if servo.baudrate == baudrate:
+                listeners.setdefault(servo.sts_id, []).append(servo)
+        replies = []
+
+        def reply(servo, data = b'', always = False):
+            if servo.sts_id in self.silent or sts_id == BROADCAST_ID and instruction != INST_SYNC_READ:
+                return
+            if always or servo.registers[STS_RESPONSE_LEVEL]:
+                delay = servo.registers[STS_RETURN_DELAY] * 2e-6 + self.latency / 1000.0
+                replies.append((delay, self.statusPacket(servo, data)))
+
+        if instruction == INST_SYNC_WRITE:
+            if len(params) < 2:
+                return []
+            address, length = params[0], params[1]
+            for offset in range(2, len(params) - length, length + 1):
+                for servo in listeners.get(params[offset], ()):
+                    servo.write(address, params[offset + 1: offset + 1 + length], now)
+            return []
+
+        if instruction == INST_SYNC_READ:
+            if len(params) < 2:
+                return []
+            address, length = params[0], params[1]
+            for target in params[2:]:
+                first = len(replies)
+                for servo in listeners.get(target, ()):
+                    reply(servo, servo.read(address, length, now), True)
+                self.collide(replies, first)
+            return self.degrade(replies, baudrate)
+
+        if sts_id == BROADCAST_ID:
+            targets = [servo for servos in listeners.values() for servo in servos]
+        else:
+            targets = listeners.get(sts_id, [])
+
+        for servo in targets:
+            if instruction == INST_PING:
+                reply(servo, always = True)
+            elif instruction == INST_READ and len(params) >= 2:
+                reply(servo, servo.read(params[0], params[1], now), True)
+            elif instruction == INST_WRITE and len(params) >= 1:
+                # the status packet uses the servo ID before the write
+                reply(servo)
+                servo.write(params[0], params[1:], now)
+            elif instruction == INST_REG_WRITE and len(params) >= 1:
+                servo.registered = (params[0], params[1:])
+                reply(servo)
+            elif instruction == INST_ACTION:
+                if servo.registered is not None:
+                    servo.write(servo.registered[0], servo.registered[1], now)
+                    servo.registered = None
+                reply(servo)
+
+        if sts_id != BROADCAST_ID:
+            self.collide(replies, 0)
+        return self.degrade(replies, baudrate)
+
+    def degrade(self, replies, baudrate):
+        # wiring too long or too loaded for the baud rate: no status packet survives
+        if self.max_baudrate is None or baudrate <= self.max_baudrate:
+            return replies
+
+        degraded = []
+        for delay, packet in replies:
+            packet = bytearray(packet)
+            packet[-1] ^= 0x55
+            degraded.append((delay, bytes(packet)))
+        return degraded
+
+    @staticmethod
+    def collide(replies, first):
+        # servos sharing an ID answer at the same time: the bytes on the wire are merged
+        # (a low bit wins) and the status packet is never received intact
+        if len(replies) - first < 2:
+            return
+
+        delay = max(delay for delay, _ in replies[first:])
+        merged = bytearray(b'\xff' * max(len(packet) for _, packet in replies[first:]))
+        for _, packet in replies[first:]:
+            for index, value in enumerate(packet):
+                merged[index] &= value
+        merged[-1] ^= 0xFF
+        replies[first:] = [(delay, bytes(merged))]
+
+
+class Serial(SerialBase):
+    """Serial port connected to a VirtualBus."""
+
+    BAUDRATES = tuple(sorted(STS_BAUDRATES.values()))
+
+    def __init__(self, *args, **kwargs):
+        self.bus = None
+        self.timing = True
+        self.condition = threading.Condition(threading.Lock())
+        self.txbuffer = bytearray()
+        self.rxqueue = collections.deque()  # [start, byte_time, data, offset]
+        self.tx_end = 0.0
+        super(Serial, self).__init__(*args, **kwargs)
+
+    def open(self):
+        if self.is_open:
+            raise SerialException("Port is already open.")
+        if self._port is None:
+            raise SerialException("Port must be configured before it can be used.")
+
+        self.bus = self.from_url(self.port)
+        self.txbuffer = bytearray()
+        self.rxqueue.clear()
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+        with self.condition:
+            self.condition.notify_all()
+        super(Serial, self).close()
+
+    def _reconfigure_port(self):
+        # the baud rate is checked by VirtualBus.process
+        pass
+
+    def from_url(self, url):
+        """parse the URL options, return the VirtualBus"""
+        parts = urlparse.urlsplit(url)
+        if parts.scheme != "sim":
+            raise SerialException('expected a string in the form "sim://[name][?ids=1,2...]": not starting with sim:// ({!r})'.format(parts.scheme))
+
+        options = {}
+        try:
+            for option, values in urlparse.parse_qs(parts.query, True).items():
+                value = values[0]
+                if option in ('ids', 'silent'):
+                    options[option] = self.parseIds(value)
+                elif option in ('baud', 'seed', 'maxbaud'):
+                    options[option] = int(value)
+                elif option in ('latency', 'tau', 'drop', 'corrupt'):
+                    options[option] = float(value)
+                elif option == 'timing':
+                    self.timing = value not in ('0', 'false', 'no')
+                else:
+                    raise ValueError('unknown option: {!r}'.format(option))
+        except ValueError as e:
+            raise SerialException('expected a string in the form "sim://[name][?ids=1,2...]": {}'.format(e))
+
+        if url not in buses:
+            buses[url] = VirtualBus(**options)
+
+        return buses[url]
+
+    @staticmethod
+    def parseIds(value):
+        ids = []
+        for item in value.split(','):
+            if '-' in item:
+                first, last = item.split('-')
+                ids.extend(range(int(first), int(last) + 1))
+            elif item:
+                ids.append(int(item))
+        return ids
+
+    @property
+    def byte_time(self):
+        # 10 bits per byte (start, 8 data, stop)
+        return 10.0 / self._baudrate if self.timing else 0.0
+
+    def available(self, chunk, now):
+        start, byte_time, data, _ = chunk
+        if byte_time == 0.0:
+            return len(data) if now >= start else 0
+        return max(0, min(len(data), int((now - start) / byte_time)))
+
+    def receive(self, length, now):
+        data = bytearray()
+        while self.rxqueue and len(data) < length:
+            chunk = self.rxqueue[0]
+            end = min(self.available(chunk, now), chunk[3] + length - len(data))
+            if end <= chunk[3]:
+                break
+            data += chunk[2][chunk[3]: end]
+            chunk[3] = end
+            if end == len(chunk[2]):
+                self.rxqueue.popleft()
+        return data
+
+    def nextByteTime(self):
+        if not self.rxqueue:
+            return None
+        start, byte_time, _, offset = self.rxqueue[0]
+        return start + (offset + 1) * byte_time
+
+    def instructionPackets(self):
+        # complete instruction packets in txbuffer, packets with a wrong checksum are ignored as by the servos
+        while True:
+            index = self.txbuffer.find(b'\xff\xff')
+            if index < 0:
+                del self.txbuffer[:-1]
+                return
+            del self.txbuffer[:index]
+
+            if len(self.txbuffer) > PKT_ID and self.txbuffer[PKT_ID] == 0xFF:
+                del self.txbuffer[:1]
+                continue
+            if len(self.txbuffer) <= PKT_LENGTH:
+                return
+
+            length = self.txbuffer[PKT_LENGTH] + PKT_LENGTH + 1
+            if len(self.txbuffer) < length:
+                return
+
+            packet = bytes(self.txbuffer[:length])
+            del self.txbuffer[:length]
+            if packet[-1] == ~sum(packet[PKT_ID: -1]) & 0xFF:
+                yield packet
+
+    #  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -
+
+    @property
+    def in_waiting(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        now = time.monotonic()
+        with self.condition:
+            return sum(self.available(chunk, now) - chunk[3] for chunk in self.rxqueue)
+
+    def read(self, size = 1):
+        if not self.is_open:
+            raise PortNotOpenError()
+
+        deadline = None if self._timeout is None else time.monotonic() + self._timeout
+        data = bytearray()
+        with self.condition:
+            while self.is_open:
+                now = time.monotonic()
+                data += self.receive(size - len(data), now)
+                if len(data) >= size or (deadline is not None and now >= deadline):
+                    break
+
+                wait = self.nextByteTime()
+                if wait is not None:
+                    wait = max(wait - now, 0.0)
+                if deadline is not None:
+                    wait = deadline - now if wait is None else min(wait, deadline - now)
+                self.condition.wait(wait)
+
+        return bytes(data)
+
+    def write(self, data):
+        if not self.is_open:
+            raise PortNotOpenError()
+
+        with self.condition:
+            self.txbuffer += data
+            byte_time = self.byte_time
+            for packet in self.instructionPackets():
+                with self.bus.lock:
+                    now = time.monotonic()
+                    self.tx_end = max(now, self.bus.wire_free) + len(packet) * byte_time
+                    end = self.tx_end
+                    for delay, reply in self.bus.process(packet, self.tx_end, self._baudrate):
+                        end += delay if self.timing else 0.0
+                        self.rxqueue.append([end, byte_time, reply, 0])
+                        end += len(reply) * byte_time
+                    self.bus.wire_free = end
+            self.condition.notify_all()
+
+        return len(data)
+
+    def flush(self):
+        # wait for the end of the transmission
+        remaining = self.tx_end - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+
+    def reset_input_buffer(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        with self.condition:
+            self.receive(float('inf'), time.monotonic())
+
+    def reset_output_buffer(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        with self.condition:
+            del self.txbuffer[:]
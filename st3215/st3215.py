@@ -6,6 +6,7 @@ from .port_handler import *
 from .protocol_packet_handler import *
 from .group_sync_write import *
 from .group_sync_read import *
+from .discovery import *
 from .values import *
 
 
@@ -14,7 +15,12 @@ __all__ = ['ST3215']
 
 class ST3215(protocol_packet_handler):
 
-    def __init__(self, device):
+    def __init__(self, device, roster_path = None):
+        """
+        :param device: serial port or pyserial URL
+        :param roster_path: file of the last known servos of each port, checked first by ListServos
+          (facultative, no roster by default; ROSTER_PATH is the usual one)
+        """
 
         self.portHandler = PortHandler(device)
         
@@ -26,6 +32,27 @@ class ST3215(protocol_packet_handler):
         self.groupSyncWrite = GroupSyncWrite(self, STS_ACC, 7)
         self.lock = threading.Lock()
 
+        # write acknowledgement policy (WRITE_ACK_ALWAYS, WRITE_ACK_NEVER or WRITE_ACK_VERIFY)
+        self.write_ack = WRITE_ACK_ALWAYS
+        self.response_level = {}  # sts_id: STS_RESPONSE_LEVEL set by SetResponseLevel
+        self.default_response_level = 1
+        self.pending_writes = {}  # (sts_id, address): data, checked by VerifyWrites
+
+        # shadow of the written registers {sts_id: {address: value}}, see writeCached
+        # shadow and read_cache are shared by the threads using the servos: accessed with cache_lock
+        self.cache_lock = threading.RLock()
+        self.shadow = {}
+        # RO registers cache {sts_id: {address: (time, value)}}, used by readRegister when read_ttl > 0 (in s)
+        self.read_ttl = 0.0
+        self.read_cache = {}
+        self.cache_generation = self.portHandler.generation
+
+        # last known servos of each port, re-verified by ListServos (None: always scan)
+        self.roster_path = roster_path
+        self.collisions = []  # IDs answered by several servos during the last scan
+
+        self.staged = set()  # servos with a REG_WRITE waiting for TriggerStaged
+
     def rad_to_servo(self, rad):
         center = 2048
         scale = 2048 / 3.1415926535
@@ -37,6 +64,196 @@ class ST3215(protocol_packet_handler):
         scale = 2048 / math.pi
         return 4095 - int(round(rad * scale + center))
 
+    def writeRegister(self, sts_id, address, data, ack = None):
+        """
+        Write registers according to the write acknowledgement policy.
+
+        :param sts_id: Servo ID
+        :param address: first register to write
+        :param data: bytes to write
+        :param ack: WRITE_ACK_ALWAYS, WRITE_ACK_NEVER or WRITE_ACK_VERIFY (facultative, self.write_ack by default)
+
+        :return: True if the configuration a been succesfully set (or sent, without acknowledgement). None in case of error.
+        """
+        if ack is None:
+            ack = self.write_ack
+
+        # a servo with response level 0 never acknowledges a write
+        if ack == WRITE_ACK_ALWAYS and self.response_level.get(sts_id, self.default_response_level) != 0:
+            comm, error = self.writeTxRx(sts_id, address, len(data), data)
+            if comm == 0 and error == 0:
+                self.updateShadow(sts_id, address, data)
+                return True
+            else:
+                self.InvalidateCache(sts_id)
+                return None
+
+        comm = self.writeTxOnly(sts_id, address, len(data), data)
+        if comm != COMM_SUCCESS:
+            self.InvalidateCache(sts_id)
+            return None
+
+        if ack == WRITE_ACK_VERIFY:
+            # kept in the shadow until VerifyWrites proves it wrong
+            self.updateShadow(sts_id, address, data)
+            with self.lock:
+                self.pending_writes[(sts_id, address)] = list(data)
+        else:
+            # unacknowledged: the value of the servo is unknown
+            self.updateShadow(sts_id, address, [None] * len(data))
+
+        return True
+
+
+    def writeCached(self, sts_id, address, data, ack = None):
+        """
+        Same as writeRegister, but nothing is sent when the shadow already holds the data.
+
+        :return: True if the configuration a been succesfully set (or is already set). None in case of error.
+        """
+        with self.cache_lock:
+            self.checkCacheGeneration()
+            shadow = self.shadow.get(sts_id)
+            if shadow is not None and all(shadow.get(address + i) == value for i, value in enumerate(data)):
+                return True
+
+        return self.writeRegister(sts_id, address, data, ack)
+
+
+    def updateShadow(self, sts_id, address, data):
+        with self.cache_lock:
+            self.checkCacheGeneration()
+            if sts_id == BROADCAST_ID:
+                # every servo got the write, but the shadow only knows the servos already written
+                for shadow in self.shadow.values():
+                    for i, value in enumerate(data):
+                        shadow[address + i] = value
+                return
+
+            shadow = self.shadow.setdefault(sts_id, {})
+            for i, value in enumerate(data):
+                shadow[address + i] = value
+
+
+    def checkCacheGeneration(self):
+        # the servos may have been reset while the port was closed
+        with self.cache_lock:
+            if self.cache_generation != self.portHandler.generation:
+                self.cache_generation = self.portHandler.generation
+                self.shadow.clear()
+                self.read_cache.clear()
+
+
+    def InvalidateCache(self, sts_id = None):
+        """
+        Forget the shadow of the written registers and the cached RO registers.
+        Done automatically after a communication error and when the port is reopened.
+        Call it after changing a servo from outside this object (other program, power cycle).
+
+        :param sts_id: Servo ID (facultative, all servos by default)
+        """
+        with self.cache_lock:
+            if sts_id is None or sts_id == BROADCAST_ID:
+                self.shadow.clear()
+                self.read_cache.clear()
+            else:
+                self.shadow.pop(sts_id, None)
+                self.read_cache.pop(sts_id, None)
+
+
+    def readRegister(self, sts_id, address, length):
+        """
+        Read a 1 or 2 bytes register. When read_ttl > 0, a value read (or sync read by ReadAll)
+        less than read_ttl seconds ago is returned without any transaction.
+
+        :return: value, communication result and servo error (as read1ByteTxRx / read2ByteTxRx)
+        """
+        if self.read_ttl > 0:
+            with self.cache_lock:
+                self.checkCacheGeneration()
+                cache = self.read_cache.get(sts_id)
+                entries = None if cache is None else [cache.get(address + i) for i in range(length)]
+            if entries is not None:
+                oldest = time.monotonic() - self.read_ttl
+                if all(entry is not None and entry[0] >= oldest for entry in entries):
+                    data = [entry[1] for entry in entries]
+                    return self.decodeRegister(data), COMM_SUCCESS, 0
+
+        data, comm, error = self.readTxRx(sts_id, address, length)
+        if comm != COMM_SUCCESS:
+            self.InvalidateCache(sts_id)
+            return 0, comm, error
+
+        if self.read_ttl > 0 and error == 0:
+            self.updateReadCache(sts_id, address, data)
+
+        return self.decodeRegister(data), comm, error
+
+
+    def decodeRegister(self, data):
+        if len(data) == 2:
+            return self.sts_makeword(data[0], data[1])
+        return data[0]
+
+
+    def updateReadCache(self, sts_id, address, data):
+        now = time.monotonic()
+        with self.cache_lock:
+            self.checkCacheGeneration()
+            cache = self.read_cache.setdefault(sts_id, {})
+            for i, value in enumerate(data):
+                cache[address + i] = (now, value)
+
+
+    def VerifyWrites(self):
+        """
+        Read back the registers written with WRITE_ACK_VERIFY since the last call (pipelined reads).
+        Use it when the bus is idle, e.g. between two gait cycles.
+
+        :return: list of (servo ID, address) whose value does not match (or could not be read)
+        """
+        with self.lock:
+            pending = list(self.pending_writes.items())
+            self.pending_writes.clear()
+
+        requests = [(sts_id, address, len(data)) for (sts_id, address), data in pending]
+        mismatches = []
+        for index, data, comm, error in self.readTxRxPipelined(requests):
+            if comm != COMM_SUCCESS or error != 0 or data != pending[index][1]:
+                mismatches.append(pending[index][0])
+                self.InvalidateCache(pending[index][0][0])
+
+        return mismatches
+
+
+    def SetResponseLevel(self, sts_id, level):
+        """
+        Configure which instructions get a status packet (EEPROM, STS_RESPONSE_LEVEL).
+        With level 0 the servo only answers READ and PING, so writes cost no reply time on the bus
+        and are never awaited whatever the write acknowledgement policy.
+
+        :param sts_id: Servo ID (BROADCAST_ID for all servos)
+        :param level: 0 (READ and PING only) or 1 (every instruction)
+
+        :return: True if the configuration a been succesfully sent. None in case of error.
+        """
+        if self.UnLockEprom(sts_id) != COMM_SUCCESS:
+            return None
+
+        comm = self.write1ByteTxOnly(sts_id, STS_RESPONSE_LEVEL, level)
+        self.LockEprom(sts_id)
+        if comm != COMM_SUCCESS:
+            return None
+
+        if sts_id == BROADCAST_ID:
+            self.response_level.clear()
+            self.default_response_level = level
+        else:
+            self.response_level[sts_id] = level
+
+        return True
+
+
     def PingServo(self, sts_id):
         """
         Check the presence of a servo.
@@ -51,18 +268,33 @@ class ST3215(protocol_packet_handler):
         return True
 
 
-    def ListServos(self):
+    def ListServos(self, rescan = False):
         """
-        Scan the bus to determine all servo present
+        Scan the bus to determine all servo present (see BusDiscovery).
+        With a roster file (self.roster_path), the servos found on the port last time are checked first:
+        when they all answer, the whole bus is not scanned, so a servo added to the bus since then
+        is only found with rescan=True. The roster is not written for simulated ports (sim://, replay://).
+        IDs answered by several servos are not listed, they are stored in self.collisions.
+
+        :param rescan: scan the whole bus even if the known servos answer (facultative, False by default)
 
         :return: A list of servo ID
         """
-        servos=[]
-        for id in range(0, 254):
-            if self.PingServo(id):
-                servos.append(id)
+        discovery = BusDiscovery(self)
+        port_name = self.portHandler.getPortName()
+
+        if not rescan and self.roster_path:
+            roster = discovery.loadRoster(self.roster_path, port_name)
+            if roster:
+                found, collisions = discovery.probe(roster)
+                if not collisions and sorted(found) == roster:
+                    return roster
 
-        return servos
+        found, self.collisions = discovery.probe(range(0, BROADCAST_ID))
+        if self.roster_path and not port_name.startswith(("sim://", "replay://")):
+            discovery.saveRoster(self.roster_path, port_name, found)
+
+        return sorted(found)
 
 
     def ReadLoad(self, sts_id):
@@ -74,7 +306,7 @@ class ST3215(protocol_packet_handler):
 
         :return: Load value in percentage. None in case of error.
         """
-        load, comm, error = self.read1ByteTxRx(sts_id, STS_PRESENT_LOAD_L)
+        load, comm, error = self.readRegister(sts_id, STS_PRESENT_LOAD_L, 1)
         if comm == 0 and error == 0:
             return load * 0.1
         else:
@@ -88,7 +320,7 @@ class ST3215(protocol_packet_handler):
 
         :return: Current Voltage in V. None in case of error.
         """
-        voltage, comm, error = self.read1ByteTxRx(sts_id, STS_PRESENT_VOLTAGE)
+        voltage, comm, error = self.readRegister(sts_id, STS_PRESENT_VOLTAGE, 1)
         if comm == 0 and error == 0:
             return voltage * 0.1
         else:
@@ -102,7 +334,7 @@ class ST3215(protocol_packet_handler):
 
         :return: Current current in mA. None in case of error.
         """
-        current, comm, error = self.read1ByteTxRx(sts_id, STS_PRESENT_CURRENT_L)
+        current, comm, error = self.readRegister(sts_id, STS_PRESENT_CURRENT_L, 1)
         if comm == 0 and error == 0:
             return current * 6.5
         else:
@@ -116,7 +348,7 @@ class ST3215(protocol_packet_handler):
 
         :return: Current temperature in °C. None in case of error.
         """
-        temperature, comm, error =  self.read1ByteTxRx(sts_id, STS_PRESENT_TEMPERATURE)
+        temperature, comm, error =  self.readRegister(sts_id, STS_PRESENT_TEMPERATURE, 1)
         if comm == 0 and error == 0:
             return temperature
         else:
@@ -184,45 +416,39 @@ class ST3215(protocol_packet_handler):
 
         :return: True is the servo is moving otherwise False. None in case of error.
         """
-        moving, comm, error =  self.read1ByteTxRx(sts_id, STS_MOVING)
+        moving, comm, error =  self.readRegister(sts_id, STS_MOVING, 1)
         if comm == 0 and error == 0:
             return bool(moving)
         else:
             return None
 
 
-    def SetAcceleration(self, sts_id, acc):
+    def SetAcceleration(self, sts_id, acc, ack = None):
         """
         Configure the Acceleration value for the servo
 
         :param sts_id: Servo ID
         :param acc: Acceleration value (0-254). Unit: 100 step/s^2)
+        :param ack: write acknowledgement policy (facultative, self.write_ack by default)
 
         :return: True if the configuration a been succesfully set. None in case of error.
         """
         txpacket = [acc]
-        comm, error = self.writeTxRx(sts_id, STS_ACC, len(txpacket), txpacket)
-        if comm == 0 and error == 0:
-            return True
-        else:
-            return None
+        return self.writeCached(sts_id, STS_ACC, txpacket, ack)
 
 
-    def SetSpeed(self, sts_id, speed):
+    def SetSpeed(self, sts_id, speed, ack = None):
         """
         Configure the Speed value for the servo
 
         :param sts_id: Servo ID
         :param acc: Speed value (0-3400). Unit: Step/s
+        :param ack: write acknowledgement policy (facultative, self.write_ack by default)
 
         :return: True if the configuration a been succesfully set. None in case of error.
         """
         txpacket = [self.sts_lobyte(speed), self.sts_hibyte(speed)]
-        comm, error = self.writeTxRx(sts_id, STS_GOAL_SPEED_L, len(txpacket), txpacket)
-        if comm == 0 and error == 0:
-            return True
-        else:
-            return None
+        return self.writeCached(sts_id, STS_GOAL_SPEED_L, txpacket, ack)
 
 
     def StopServo(self, sts_id):
@@ -234,11 +460,7 @@ class ST3215(protocol_packet_handler):
         :return: True if the configuration a been succesfully set. None in case of error.
         """
         txpacket = [0]
-        comm, error = self.writeTxRx(sts_id, STS_TORQUE_ENABLE, len(txpacket), txpacket)
-        if comm == 0 and error == 0:
-            return True
-        else:
-            return None
+        return self.writeRegister(sts_id, STS_TORQUE_ENABLE, txpacket, WRITE_ACK_ALWAYS)
 
 
     def StartServo(self, sts_id):
@@ -250,7 +472,7 @@ class ST3215(protocol_packet_handler):
         :return: True if the configuration a been succesfully set. None in case of error.
         """
         txpacket = [1]
-        return self.writeTxRx(sts_id, STS_TORQUE_ENABLE, len(txpacket), txpacket)
+        return self.writeCached(sts_id, STS_TORQUE_ENABLE, txpacket, WRITE_ACK_ALWAYS)
 
 
 
@@ -264,7 +486,7 @@ class ST3215(protocol_packet_handler):
         :return: True if the configuration a been succesfully set. None in case of error.
         """
         txpacket = [mode]
-        return self.writeTxRx(sts_id, STS_MODE, len(txpacket), txpacket)
+        return self.writeCached(sts_id, STS_MODE, txpacket, WRITE_ACK_ALWAYS)
 
 
 
@@ -286,7 +508,7 @@ class ST3215(protocol_packet_handler):
         if correction < 0:
             txpacket[1] |= (1 << 3)
 
-        return self.writeTxRx(sts_id, STS_OFS_L, len(txpacket), txpacket)
+        return self.writeCached(sts_id, STS_OFS_L, txpacket, WRITE_ACK_ALWAYS)
 
 
     def Rotate(self, sts_id, speed):
@@ -310,7 +532,7 @@ class ST3215(protocol_packet_handler):
         if speed < 0:
             txpacket[1] |= (1 << 7)
 
-        return self.writeTxRx(sts_id, STS_GOAL_SPEED_L, len(txpacket), txpacket)
+        return self.writeRegister(sts_id, STS_GOAL_SPEED_L, txpacket, WRITE_ACK_ALWAYS)
 
 
 
@@ -358,11 +580,10 @@ class ST3215(protocol_packet_handler):
         :return: True if the configuration a been succesfully set. None in case of error.
         """
         txpacket = [128]
-        comm, error = self.writeTxRx(sts_id, STS_TORQUE_ENABLE, len(txpacket), txpacket)
-        if comm == 0 and error == 0:
-            return True
-        else:
-            return None
+        result = self.writeRegister(sts_id, STS_TORQUE_ENABLE, txpacket, WRITE_ACK_ALWAYS)
+        # 128 is a command, not the new torque state
+        self.updateShadow(sts_id, STS_TORQUE_ENABLE, [None])
+        return result
 
 
 
@@ -440,38 +661,199 @@ class ST3215(protocol_packet_handler):
         if res_acc == None or res_speed == None or res_mode == None:
             return None
 
-        curr_pos = self.ReadPosition(sts_id) 
+        # the present position is only needed to wait for the end of the move
+        if wait == True:
+            curr_pos = self.ReadPosition(sts_id)
+            if curr_pos == None:
+                return None
 
         res_pos = self.WritePosition(sts_id, position)
         if res_pos == None:
             return None
 
         if wait == True:
-            if position == None:
+            distance = abs(position - curr_pos)
+            time.sleep(self.estimateMoveTime(distance, speed, acc))
+
+        return True
+
+
+    @staticmethod
+    def estimateMoveTime(distance, speed, acc):
+        """
+        Estimate the duration of a move
+
+        :param distance: distance in steps
+        :param speed: Move speed in step/s
+        :param acc: Accelaration value (Unit: 100 step/s²)
+
+        :return: duration in s
+        """
+        if speed <= 0:
+            speed = MAX_SPEED  # 0: maximum speed
+        if acc <= 0:
+            return distance / speed  # 0: maximum acceleration
+
+        time_to_speed = speed / (acc * 100)
+
+        distance_acc = 0.5 * (acc * 100) * time_to_speed ** 2
+
+        if distance_acc >= distance:
+            return math.sqrt(2 * distance / (acc * 100))
+        else:
+            remain_distance = distance - distance_acc
+            return time_to_speed + (remain_distance / speed)
+
+
+
+    def MoveMany(self, moves, wait = False):
+        """
+        Move several servos, each one with its own speed and acceleration.
+        The block STS_ACC..STS_GOAL_SPEED_H (acc, goal position, goal time, goal speed) of every servo
+        is written with a single sync write packet (several when they do not fit in one packet).
+
+        :param moves: dict {servo ID: (position, speed, acc)}
+        :param wait: Wait the end of the slowest move before the function return (facultative, False by default)
+
+        :return: True. None in case of error.
+        """
+        for sts_id in moves:
+            if self.SetMode(sts_id, 0) == None:
+                return None
+
+        # the present positions are only needed to wait for the end of the moves
+        if wait == True:
+            telemetry = self.ReadAll(list(moves), ("position",))
+            if any(telemetry[sts_id] is None for sts_id in moves):
                 return None
-            else:
-                distance = abs(position - curr_pos)
 
-            time_to_speed = speed / (acc * 100)
+        data_length = self.groupSyncWrite.data_length
+        per_packet = (TXPACKET_MAX_LEN - 8) // (1 + data_length)  # HEADER0 HEADER1 ID LEN INST START_ADDR DATA_LEN ... CHKSUM
+        items = list(moves.items())
+
+        with self.lock:
+            for first in range(0, len(items), per_packet):
+                self.groupSyncWrite.clearParam()
+                for sts_id, (position, speed, acc) in items[first: first + per_packet]:
+                    block = [acc,
+                             self.sts_lobyte(position), self.sts_hibyte(position),
+                             0, 0,
+                             self.sts_lobyte(speed), self.sts_hibyte(speed)]
+                    self.groupSyncWrite.addParam(sts_id, block)
+                    # broadcasted: the values written are not acknowledged
+                    self.updateShadow(sts_id, STS_ACC, [None] * data_length)
+
+                if self.groupSyncWrite.txPacket() != COMM_SUCCESS:
+                    return None
 
-            distance_acc = 0.5 * (acc * 100) * time_to_speed ** 2
+        if wait == True:
+            time.sleep(max(self.estimateMoveTime(abs(position - telemetry[sts_id]["position"]), speed, acc)
+                           for sts_id, (position, speed, acc) in moves.items()))
 
-            if distance_acc >= distance:
-                time_wait = math.sqrt(2 * distance / acc)
-            else:
-                remain_distance = distance - distance_acc
-                time_wait = time_to_speed + (remain_distance / speed)
+        return True
+
+
+    def StageMove(self, sts_id, position, speed = 2400, acc = 50, ack = None):
+        """
+        Register a move (REG_WRITE) without starting it: the servo waits for TriggerStaged.
+        The block STS_ACC..STS_GOAL_SPEED_H is registered, as written by MoveMany.
+        A servo keeps only its last staged move.
+
+        :param sts_id: Servo ID
+        :param position: New position of the Servo
+        :param speed: Move speed in step/s (facultative, 2400 by default)
+        :param acc: Acceleration speed in step/s² (facultative, 50 by default)
+        :param ack: write acknowledgement policy (facultative, self.write_ack by default)
+
+        :return: True. None in case of error.
+        """
+        if self.SetMode(sts_id, 0) == None:
+            return None
+
+        if ack is None:
+            ack = self.write_ack
+
+        block = [acc,
+                 self.sts_lobyte(position), self.sts_hibyte(position),
+                 0, 0,
+                 self.sts_lobyte(speed), self.sts_hibyte(speed)]
+
+        if ack == WRITE_ACK_ALWAYS and self.response_level.get(sts_id, self.default_response_level) != 0:
+            comm, error = self.regWriteTxRx(sts_id, STS_ACC, len(block), block)
+            if comm != COMM_SUCCESS or error != 0:
+                return None
+        elif self.regWriteTxOnly(sts_id, STS_ACC, len(block), block) != COMM_SUCCESS:
+            return None
+
+        with self.lock:
+            self.staged.add(sts_id)
+        return True
+
+
+    def StageMany(self, moves, ack = None):
+        """
+        Register the moves of several servos (see StageMove), started together by TriggerStaged.
+
+        :param moves: dict {servo ID: (position, speed, acc)}
+        :param ack: write acknowledgement policy (facultative, self.write_ack by default)
+
+        :return: True. None in case of error.
+        """
+        for sts_id, (position, speed, acc) in moves.items():
+            if self.StageMove(sts_id, position, speed, acc, ack) == None:
+                return None
+
+        return True
+
+
+    def TriggerStaged(self):
+        """
+        Start the staged moves of all the servos at once, with a single broadcast ACTION.
+
+        :return: True. None in case of error.
+        """
+        if self.action(BROADCAST_ID) != COMM_SUCCESS:
+            return None
 
-            time.sleep(time_wait)
+        with self.lock:
+            staged, self.staged = self.staged, set()
+        for sts_id in staged:
+            # broadcasted: the values written are not acknowledged
+            self.updateShadow(sts_id, STS_ACC, [None] * 7)
 
         return True
 
 
+    def WritePosition(self, sts_id, position, ack = None):
+        """
+        Write the goal position
 
-    def WritePosition(self, sts_id, position):
+        :param sts_id: Servo ID
+        :param position: New position of the Servo
+        :param ack: write acknowledgement policy (facultative, self.write_ack by default)
+
+        :return: True. None in case of error.
+        """
         txpacket = [self.sts_lobyte(position), self.sts_hibyte(position)]
-        comm, error = self.writeTxRx(sts_id, STS_GOAL_POSITION_L, len(txpacket), txpacket)
-        if comm == 0 and error == 0:
+        return self.writeRegister(sts_id, STS_GOAL_POSITION_L, txpacket, ack)
+
+
+    def SyncWritePosition(self, positions):
+        """
+        Write the goal position of several servos with a single sync write packet.
+        The packet is broadcasted, so no status packet is awaited.
+
+        :param positions: dict {servo ID: position}
+
+        :return: True in case of success, None in case of error.
+        """
+        # local group: SyncWritePosition may be called from several threads
+        groupSyncWrite = GroupSyncWrite(self, STS_GOAL_POSITION_L, 2)
+        for sts_id, position in positions.items():
+            groupSyncWrite.addParam(sts_id, [self.sts_lobyte(position), self.sts_hibyte(position)])
+
+        comm = groupSyncWrite.txPacket()
+        if comm == COMM_SUCCESS:
             return True
         else:
             return None
@@ -485,24 +867,121 @@ class ST3215(protocol_packet_handler):
 
         :return: dict of sensor status in case of success, otherwise None
         """
-        status_bits = ["Voltage", "Sensor", "Temperature", "Current", "Angle", "Overload"]
-
         status = {}
 
-        status_byte, comm, error =  self.read1ByteTxRx(sts_id, STS_STATUS)
+        status_byte, comm, error =  self.readRegister(sts_id, STS_STATUS, 1)
         if comm != 0 or error != 0:
             return None
 
 
         for i in range(6):
             if status_byte & (1 << i):
-                status[status_bits[i]] = False
+                status[STATUS_BITS[i]] = False
             else:
-                status[status_bits[i]] = True
+                status[STATUS_BITS[i]] = True
 
         return status
 
 
+    def ReadAll(self, sts_ids, fields = TELEMETRY_FIELDS):
+        """
+        Read the telemetry of several servos in a single sync read transaction (several when
+        they do not fit in one packet). The whole SRAM RO block (STS_PRESENT_POSITION_L..STS_PRESENT_CURRENT_H) is read
+        for every servo, then the requested fields are decoded.
+
+        :param sts_ids: list of servo ID
+        :param fields: list of fields to decode (facultative, all of TELEMETRY_FIELDS by default):
+          position, speed, load, voltage, temperature, status, moving, current
+
+        :return: dict {servo ID: dict {field: value}}. The servo entry is None in case of error.
+        """
+        # local group: ReadAll may be called from several threads
+        groupSyncRead = GroupSyncRead(self, STS_PRESENT_POSITION_L, STS_PRESENT_CURRENT_H - STS_PRESENT_POSITION_L + 1)
+        per_packet = TXPACKET_MAX_LEN - 8  # HEADER0 HEADER1 ID LEN INST START_ADDR DATA_LEN ... CHKSUM
+        sts_ids = list(sts_ids)
+
+        telemetry = {}
+        for first in range(0, len(sts_ids), per_packet):
+            group = sts_ids[first: first + per_packet]
+            groupSyncRead.clearParam()
+            for sts_id in group:
+                groupSyncRead.addParam(sts_id)
+
+            groupSyncRead.txRxPacket()
+
+            for sts_id in group:
+                available, error = groupSyncRead.isAvailable(sts_id, STS_PRESENT_POSITION_L, groupSyncRead.data_length)
+                if not available or error != 0:
+                    telemetry[sts_id] = None
+                    continue
+
+                telemetry[sts_id] = {field: self.decodeTelemetry(groupSyncRead, sts_id, field) for field in fields}
+                if self.read_ttl > 0:
+                    self.updateReadCache(sts_id, STS_PRESENT_POSITION_L, groupSyncRead.data_dict[sts_id][1:])
+
+        return telemetry
+
+
+    @staticmethod
+    def decodeTelemetry(groupSyncRead, sts_id, field):
+        """
+        Decode one telemetry field from a sync read, with the same scaling as the Read* functions.
+
+        :param groupSyncRead: GroupSyncRead of the SRAM RO block
+        :param sts_id: Servo ID
+        :param field: field name (Cf TELEMETRY_FIELDS)
+
+        :return: decoded value
+        """
+        data = groupSyncRead.getData
+        if field == "position":
+            return data(sts_id, STS_PRESENT_POSITION_L, 2)
+        elif field == "speed":
+            return groupSyncRead.ph.sts_tohost(data(sts_id, STS_PRESENT_SPEED_L, 2), 15)
+        elif field == "load":
+            return data(sts_id, STS_PRESENT_LOAD_L, 1) * 0.1
+        elif field == "voltage":
+            return data(sts_id, STS_PRESENT_VOLTAGE, 1) * 0.1
+        elif field == "temperature":
+            return data(sts_id, STS_PRESENT_TEMPERATURE, 1)
+        elif field == "status":
+            status_byte = data(sts_id, STS_STATUS, 1)
+            return {name: not (status_byte & (1 << i)) for i, name in enumerate(STATUS_BITS)}
+        elif field == "moving":
+            return bool(data(sts_id, STS_MOVING, 1))
+        elif field == "current":
+            return data(sts_id, STS_PRESENT_CURRENT_L, 1) * 6.5
+        else:
+            raise ValueError(f"Unknown telemetry field: {field}")
+
+
+    def ReadRegisters(self, requests, depth = PIPELINE_DEPTH):
+        """
+        Read registers that are not contiguous (or on servos that do not support sync read)
+        with pipelined READ instructions, instead of one full round trip per register.
+
+        :param requests: list of (servo ID, address, length)
+        :param depth: maximum number of READ instructions waiting for their status packet (facultative)
+
+        :return: list of values, in the order of requests: the register value for 1 and 2 bytes reads,
+                 the list of bytes otherwise. None in case of error.
+        """
+        values = [None] * len(requests)
+        for index, data, comm, error in self.readTxRxPipelined(requests, depth):
+            if comm != COMM_SUCCESS or error != 0:
+                continue
+
+            length = requests[index][2]
+            if length == 1:
+                values[index] = data[0]
+            elif length == 2:
+                values[index] = self.sts_makeword(data[0], data[1])
+            else:
+                values[index] = data
+
+        return values
+
+
     def ReadPosition(self, sts_id):
         """
         Get the current position
@@ -511,7 +990,7 @@ class ST3215(protocol_packet_handler):
 
         :return: position in case of success, otherwise None
         """
-        position, comm, error = self.read2ByteTxRx(sts_id, STS_PRESENT_POSITION_L)
+        position, comm, error = self.readRegister(sts_id, STS_PRESENT_POSITION_L, 2)
         if comm == 0 and error == 0:
             return position
         else:
@@ -525,7 +1004,7 @@ class ST3215(protocol_packet_handler):
 
         :return: speed in case of success, otherwise None
         """
-        sts_present_speed, sts_comm_result, sts_error = self.read2ByteTxRx(sts_id, STS_PRESENT_SPEED_L)
+        sts_present_speed, sts_comm_result, sts_error = self.readRegister(sts_id, STS_PRESENT_SPEED_L, 2)
         return self.sts_tohost(sts_present_speed, 15), sts_comm_result, sts_error
 
 
@@ -570,9 +1049,103 @@ class ST3215(protocol_packet_handler):
                 return "Could not change Servo ID" 
 
             self.LockEprom(sts_id)
+            self.InvalidateCache(sts_id)
+            self.InvalidateCache(new_id)
             return None
         else:
             return "new_id is not between 0 and 253" 
 
 
 
+
+
+    def DetectBaudRate(self, sts_ids = None):
+        """
+        Sweep the baud rates supported by the servos (fastest first) and look for servos at each one.
+        The port is left at the baud rate where the most servos answered (unchanged when none did).
+
+        :param sts_ids: list of servo ID to look for (facultative, the whole ID range by default)
+
+        :return: dict {baud rate: list of servo ID} of the baud rates where servos answered
+        """
+        ids = range(0, BROADCAST_ID) if sts_ids is None else list(sts_ids)
+        discovery = BusDiscovery(self)
+        initial = self.portHandler.getBaudRate()
+        found = {}
+        best = None
+        try:
+            for baudrate in sorted(BAUDRATE_CODES, reverse=True):
+                self.portHandler.setBaudRate(baudrate)
+                servos, _ = discovery.probe(ids)
+                if servos:
+                    found[baudrate] = sorted(servos)
+
+            best = max(found, key=lambda baudrate: len(found[baudrate]), default=None)
+        finally:
+            # also when the sweep is interrupted
+            self.portHandler.setBaudRate(best or initial)
+
+        return found
+
+
+    def UpgradeBus(self, sts_ids = None, baudrate = 1000000):
+        """
+        Move the servos and the port to the highest baud rate at which the bus is reliable.
+        The faster baud rates are tried in turn: the Bus Speed is written in the Eeprom of every servo,
+        the port follows, then BAUD_UPGRADE_CHECKS sync reads of all the servos must succeed.
+        Otherwise the servos and the port are set back to the previous baud rate and the next one is tried.
+
+        :param sts_ids: list of servo ID (facultative, found by ListServos by default)
+        :param baudrate: highest baud rate to try (facultative, 1 Mbps by default)
+
+        :return: baud rate of the bus. None in case of error (servo missing, or lost during a roll back).
+        """
+        initial = self.portHandler.getBaudRate()
+        sts_ids = sorted(self.ListServos() if sts_ids is None else sts_ids)
+        if not sts_ids or not self.verifyBus(sts_ids, 1):
+            return None
+
+        for candidate in sorted((rate for rate in BAUDRATE_CODES if initial < rate <= baudrate), reverse=True):
+            self.setBusBaudRate(sts_ids, candidate)
+            if self.verifyBus(sts_ids, BAUD_UPGRADE_CHECKS):
+                return candidate
+
+            # the servos heard the new Bus Speed even if their status packets are lost
+            self.setBusBaudRate(sts_ids, initial)
+            if not self.verifyBus(sts_ids, 1):
+                return None
+
+        return initial
+
+
+    def setBusBaudRate(self, sts_ids, baudrate):
+        # unlock and Bus Speed at the current baud rate, lock at the new one
+        self.syncWriteByte(sts_ids, STS_LOCK, 0)
+        self.syncWriteByte(sts_ids, STS_BAUD_RATE, BAUDRATE_CODES[baudrate])
+        self.portHandler.setBaudRate(baudrate)
+        self.syncWriteByte(sts_ids, STS_LOCK, 1)
+        for sts_id in sts_ids:
+            self.InvalidateCache(sts_id)
+
+
+    def syncWriteByte(self, sts_ids, address, value):
+        # local group: the shared one writes the move block (see MoveMany)
+        groupSyncWrite = GroupSyncWrite(self, address, 1)
+        per_packet = (TXPACKET_MAX_LEN - 8) // 2  # HEADER0 HEADER1 ID LEN INST START_ADDR DATA_LEN ... CHKSUM
+        for first in range(0, len(sts_ids), per_packet):
+            groupSyncWrite.clearParam()
+            for sts_id in sts_ids[first: first + per_packet]:
+                groupSyncWrite.addParam(sts_id, [value])
+            if groupSyncWrite.txPacket() != COMM_SUCCESS:
+                return None
+
+        return True
+
+
+    def verifyBus(self, sts_ids, checks):
+        for _ in range(checks):
+            telemetry = self.ReadAll(sts_ids, ("position",))
+            if any(telemetry[sts_id] is None for sts_id in sts_ids):
+                return False
+
+        return True
@@ -0,0 +1,97 @@
+from .values import *
+
+
+class TimeoutEstimator(object):
+    """
+    Adaptive status packet timeout.
+
+    Learns the reply latency of every servo (time between the end of the instruction packet
+    and the end of the status packet, minus the status packet transmission time) with an
+    EWMA of the mean and of the mean deviation, as the TCP retransmission timer does.
+    The latency budget of a servo is mean + max(k * deviation, ADAPTIVE_TIMEOUT_MARGIN + transfer),
+    bounded by LATENCY_TIMER: the margin never drops below the OS jitter plus the transmission time
+    of the status packet, which may be delayed as a whole. Servos without enough samples use the bus-wide
+    estimate, and LATENCY_TIMER is used until the bus itself has enough samples.
+    """
+
+    def __init__(self, alpha = 0.125, beta = 0.25, k = 4.0,
+                 min_margin = ADAPTIVE_TIMEOUT_MARGIN, max_timeout = LATENCY_TIMER,
+                 min_samples = ADAPTIVE_TIMEOUT_SAMPLES):
+        self.alpha = alpha
+        self.beta = beta
+        self.k = k
+        self.min_margin = min_margin
+        self.max_timeout = max_timeout
+        self.min_samples = min_samples
+
+        self.servos = {}  # sts_id: [mean, deviation, samples, missed]
+        self.bus = [0.0, 0.0, 0, False]
+
+    def reset(self, sts_id = None):
+        if sts_id is None:
+            self.servos.clear()
+            self.bus = [0.0, 0.0, 0, False]
+        else:
+            self.servos.pop(sts_id, None)
+
+    def learn(self, estimate, latency):
+        mean, deviation, samples, _ = estimate
+        if samples == 0:
+            mean = latency
+            deviation = latency / 2.0
+        else:
+            deviation += self.beta * (abs(latency - mean) - deviation)
+            mean += self.alpha * (latency - mean)
+
+        estimate[0] = mean
+        estimate[1] = deviation
+        estimate[2] = samples + 1
+        estimate[3] = False
+
+    def update(self, sts_id, latency):
+        """
+        Record the latency of a status packet.
+
+        :param sts_id: Servo ID
+        :param latency: reply latency in ms
+        """
+        if latency < 0.0:
+            latency = 0.0
+
+        if sts_id not in self.servos:
+            self.servos[sts_id] = [0.0, 0.0, 0, False]
+
+        self.learn(self.servos[sts_id], latency)
+        self.learn(self.bus, latency)
+
+    def miss(self, sts_id):
+        """
+        Record a status packet timeout. The next timeout of a servo that used to answer is doubled once,
+        so that a single slow reply does not fail twice in a row.
+
+        :param sts_id: Servo ID
+        """
+        if sts_id in self.servos:
+            self.servos[sts_id][3] = True
+
+    def timeout(self, sts_id, transfer = 0.0):
+        """
+        Latency budget for the next status packet of a servo.
+
+        :param sts_id: Servo ID
+        :param transfer: transmission time of the status packet in ms (facultative, 0 by default)
+
+        :return: timeout in ms
+        """
+        estimate = self.servos.get(sts_id)
+        if estimate is None or estimate[2] < self.min_samples:
+            estimate = self.bus
+            if estimate[2] < self.min_samples:
+                return self.max_timeout
+
+        mean, deviation, _, missed = estimate
+        timeout = mean + max(self.k * deviation, self.min_margin + transfer)
+        if missed:
+            timeout *= 2.0
+
+        return min(timeout, self.max_timeout)
@@ -1,8 +1,18 @@
 DEFAULT_BAUDRATE = 1000000
 LATENCY_TIMER = 50 
+ADAPTIVE_TIMEOUT_MARGIN = 5.0  # ms, minimum margin over the learned latency (OS scheduling, USB frames)
+ADAPTIVE_TIMEOUT_SAMPLES = 8
 
 TXPACKET_MAX_LEN = 250
 RXPACKET_MAX_LEN = 250
+RXBUFFER_LEN = 1024
+PIPELINE_DEPTH = 4  # pipelined reads waiting for their status packet
+PIPELINE_RX_BYTES = 64  # status packet bytes expected at once by pipelined reads
+ASYNC_POLL_PERIOD = 0.001  # s, AsyncST3215 port polling when there is no file descriptor
+DISCOVERY_RANGE = 64  # IDs probed by one sync read (see BusDiscovery)
+DISCOVERY_TIMEOUT = 5.0  # ms, maximum status packet latency waited for during discovery
+ROSTER_PATH = "~/.st3215_roster.json"  # last known servos of each port (see ST3215.ListServos)
+STATS_LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)  # ms, upper bounds of the BusStats latency histogram
 
 MIN_POSITION = 0
 MAX_POSITION = 4095
@@ -52,6 +62,19 @@ COMM_RX_TIMEOUT = -6  # There is no status packet
 COMM_RX_CORRUPT = -7  # Incorrect status packet
 COMM_NOT_AVAILABLE = -9  #
 
+# Capture record direction (see PortHandler.startCapture)
+CAPTURE_TX = 0  # instruction packet written on the port
+CAPTURE_RX = 1  # bytes read from the port
+
+# Write acknowledgement policy (see ST3215.write_ack)
+WRITE_ACK_ALWAYS = 0  # wait for the status packet
+WRITE_ACK_NEVER = 1  # send the instruction only
+WRITE_ACK_VERIFY = 2  # send the instruction only, read the register back in ST3215.VerifyWrites
+
+# Bus priority (lower value first, see BusScheduler)
+PRIORITY_CONTROL = 0  # write, reg write, action, sync write
+PRIORITY_TELEMETRY = 1  # ping, read, sync read
+
 
 
 # Bus Speed
@@ -64,6 +87,28 @@ STS_76800 = 5
 STS_57600 = 6
 STS_38400 = 7
 
+# Bus Speed code: baud rate
+STS_BAUDRATES = {
+    STS_1M: 1000000,
+    STS_0_5M: 500000,
+    STS_250K: 250000,
+    STS_128K: 128000,
+    STS_115200: 115200,
+    STS_76800: 76800,
+    STS_57600: 57600,
+    STS_38400: 38400,
+}
+# baud rate: Bus Speed code
+BAUDRATE_CODES = {baudrate: code for code, baudrate in STS_BAUDRATES.items()}
+BAUD_UPGRADE_CHECKS = 20  # sync reads of all the servos that must succeed at a new baud rate (see ST3215.UpgradeBus)
+
+# Virtual servo (protocol_sim)
+SIM_MODEL = 777  # ST3215 model number
+SIM_LATENCY = 0.1  # ms, time between the end of an instruction packet and the status packet
+SIM_TAU = 0.05  # s, time constant of the first-order motion model
+SIM_VOLTAGE = 120  # 0.1 V
+SIM_TEMPERATURE = 35  # °C
+
 # EPROM RO
 STS_MODEL_L = 3
 STS_MODEL_H = 4
@@ -71,6 +116,8 @@ STS_MODEL_H = 4
 # EPROM RW
 STS_ID = 5
 STS_BAUD_RATE = 6
+STS_RETURN_DELAY = 7
+STS_RESPONSE_LEVEL = 8  # 0: status packet for READ and PING only, 1: for every instruction
 STS_MIN_ANGLE_LIMIT_L = 9
 STS_MIN_ANGLE_LIMIT_H = 10
 STS_MAX_ANGLE_LIMIT_L = 11
@@ -106,4 +153,10 @@ STS_MOVING = 66
 STS_PRESENT_CURRENT_L = 69
 STS_PRESENT_CURRENT_H = 70
 
+# Status register bits (STS_STATUS)
+STATUS_BITS = ["Voltage", "Sensor", "Temperature", "Current", "Angle", "Overload"]
+
+# Fields decoded by ST3215.ReadAll
+TELEMETRY_FIELDS = ("position", "speed", "load", "voltage", "temperature", "status", "moving", "current")
+
 
@@ -1,14 +1,20 @@
 import time
 import math
 from st3215 import ST3215
+from st3215.values import ROSTER_PATH
 
 
-servo = ST3215('COM3')
+servo = ST3215('COM3', ROSTER_PATH)
 
 ###################################################### SETTING SECTION #################
 
 ######################## List servos
 print(servos := servo.ListServos())
+# print(servos := servo.ListServos(rescan=True))  # full scan, ignoring the last known servos
+
+######################## Baud rate
+# print(servo.DetectBaudRate())  # servos found at each baud rate, the port stays at the best one
+# print(servo.UpgradeBus())  # fastest reliable baud rate for the whole bus
 
 ######################## Ping servo
 # print(alive := servo.PingServo(1))